@@ -0,0 +1,246 @@
+# Re-analysis
+#
+# Replays the games of a record archive (see records.py) against the pattern
+# player as it is now and counts, per pattern id:
+#   found       - substrategies of the id find_substrategies turned up
+#   threatened  - replies to a white stone inside a substrategy of the id
+#   chosen      - replies in a substrategy of the id picked at random because
+#                 white's stone threatened none
+#   decomposed  - substrategies decompose_pattern split into smaller ones
+#   wins/losses - finished games black won or lost after replying with the id
+#   seconds     - time spent in get_move for the id
+# and where black's replies came from: a pattern, the solved table or opening
+# book, the search or evaluator, or a random empty cell. The random replies
+# are also counted by black's move number.
+#
+# White's recorded moves are played through place_stone, so black answers
+# them with the current patterns. A game whose next white cell is already
+# taken has left the record and stops there, its replies count but it has no
+# winner.
+#
+# The archive is cut into chunks of CHUNK_RECORDS games at the offsets
+# records.record_spans finds, the chunks are analysed over a process pool and
+# each chunk's stats are merged into the totals as it comes back. Every game
+# is seeded by its number in the archive, so the totals don't depend on the
+# number of workers.
+#
+# Example: python analysis.py games.bin --hsearch --output analysis.json
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import patterns
+import records
+import selfplay
+import tournament
+
+# Games per task
+CHUNK_RECORDS = 500
+# Where a reply came from
+SOURCES = ('pattern', 'book', 'search', 'random')
+PATTERN_COUNTS = ('found', 'threatened', 'chosen', 'decomposed', 'wins', 'losses')
+
+def new_stats():
+    return {
+        'games': 0,
+        'black_wins': 0,
+        'white_wins': 0,
+        # Games that stopped without a winner, and finished games whose
+        # winner differs from the record's
+        'unfinished': 0,
+        'changed': 0,
+        'reply_seconds': 0.0,
+        'sources': dict.fromkeys(SOURCES, 0),
+        'random_by_move': {},
+        'patterns': {},
+    }
+
+def pattern_stats(stats, pattern_id):
+    entry = stats['patterns'].get(pattern_id)
+    if entry is None:
+        entry = stats['patterns'][pattern_id] = dict.fromkeys(PATTERN_COUNTS, 0)
+        entry['seconds'] = 0.0
+    return entry
+
+def merge_stats(total, part):
+    # Adds part into total, both from new_stats
+    for key, value in part.items():
+        if isinstance(value, dict):
+            merge_stats(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+def instrument(board, stats, game):
+    # Replaces the board's methods with wrappers that add to stats. game
+    # holds the pattern ids black replied with in this game and where the
+    # current reply came from. place_stone looks the methods up on the
+    # board, so the wrappers see every call it makes
+    get_move = board.get_move
+    decompose_pattern = board.decompose_pattern
+    find_substrategies = board.find_substrategies
+    search_strategies = board.search_strategies
+    book_move = board.book_move
+    fallback_move = board.fallback_move
+
+    def counted_get_move(strat, white_move):
+        entry = pattern_stats(stats, strat.pattern_id)
+        entry['threatened' if white_move in strat.cells else 'chosen'] += 1
+        game['used'].add(strat.pattern_id)
+        game['source'] = 'pattern'
+        start = time.perf_counter()
+        try:
+            return get_move(strat, white_move)
+        finally:
+            entry['seconds'] += time.perf_counter() - start
+
+    def counted_decompose_pattern(pattern_id, pattern, move):
+        pattern_stats(stats, pattern_id)['decomposed'] += 1
+        return decompose_pattern(pattern_id, pattern, move)
+
+    def counted_find_substrategies():
+        before = set(board.substrategies)
+        find_substrategies()
+        for record in board.substrategies:
+            if record not in before:
+                pattern_stats(stats, record.pattern_id)['found'] += 1
+
+    def counted_search_strategies(x, y):
+        game['source'] = None
+        start = time.perf_counter()
+        try:
+            move = search_strategies(x, y)
+        finally:
+            stats['reply_seconds'] += time.perf_counter() - start
+        if game['source'] is None:
+            # No substrategy left, search_strategies picked a random cell
+            game['source'] = 'random'
+        return move
+
+    def counted_book_move():
+        move = book_move()
+        if move is not None:
+            game['source'] = 'book'
+        return move
+
+    def counted_fallback_move():
+        game['source'] = 'search' if board.mcts is not None or board.evaluator is not None else 'random'
+        return fallback_move()
+
+    board.get_move = counted_get_move
+    board.decompose_pattern = counted_decompose_pattern
+    board.find_substrategies = counted_find_substrategies
+    board.search_strategies = counted_search_strategies
+    board.book_move = counted_book_move
+    board.fallback_move = counted_fallback_move
+
+def analyse_game(record, stats, seed, options):
+    # Replays one record against the current patterns and adds it to stats
+    random.seed(seed)
+    board = selfplay.configure_board(patterns.HexBoard(record.board_dimension), options, seed)
+    game = {'used': set(), 'source': None}
+    instrument(board, stats, game)
+    for board, x, y, color in records.replay(record, board, respond=True):
+        if color == patterns.WHITE and game['source'] is not None:
+            stats['sources'][game['source']] += 1
+            if game['source'] == 'random':
+                move_number = bin(board.black_bits).count('1')
+                stats['random_by_move'][move_number] = stats['random_by_move'].get(move_number, 0) + 1
+            game['source'] = None
+
+    stats['games'] += 1
+    winner = board.detect_win()
+    if winner == 0:
+        stats['unfinished'] += 1
+        return
+    stats['black_wins' if winner == patterns.BLACK else 'white_wins'] += 1
+    if winner != record.winner:
+        stats['changed'] += 1
+    for pattern_id in game['used']:
+        pattern_stats(stats, pattern_id)['wins' if winner == patterns.BLACK else 'losses'] += 1
+
+def analyse_chunk(task):
+    # Analyses one chunk of an archive in a worker process and returns its
+    # stats
+    path, offset, count, first_game, seed, options = task
+    stats = new_stats()
+    for number, record in enumerate(records.read_records(path, offset, count), first_game):
+        analyse_game(record, stats, tournament.game_seed(seed, number), options)
+    return stats
+
+def make_tasks(path, seed=0, options=None, chunk_records=CHUNK_RECORDS):
+    # One task per chunk of the archive
+    options = options or {}
+    tasks = []
+    for number, (start, end) in enumerate(records.record_spans(path)):
+        if number % chunk_records == 0:
+            tasks.append((path, start, chunk_records, number, seed, options))
+    return tasks
+
+def run_analysis(path, seed=0, workers=None, options=None, chunk_records=CHUNK_RECORDS, progress=None):
+    # Analyses a whole archive and returns the merged stats. progress, if
+    # given, is called with the totals after every chunk
+    tasks = make_tasks(path, seed, options, chunk_records)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    total = new_stats()
+    if workers == 1:
+        results = map(analyse_chunk, tasks)
+        for stats in results:
+            merge_stats(total, stats)
+            if progress is not None:
+                progress(total)
+        return total
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for stats in executor.map(analyse_chunk, tasks):
+            merge_stats(total, stats)
+            if progress is not None:
+                progress(total)
+    return total
+
+def format_stats(stats):
+    lines = ['%d games, black %d white %d, %d unfinished, %d with a different winner than recorded'
+             % (stats['games'], stats['black_wins'], stats['white_wins'], stats['unfinished'], stats['changed'])]
+    replies = sum(stats['sources'].values())
+    lines.append('%d replies in %.2f s: ' % (replies, stats['reply_seconds'])
+                 + ', '.join('%s %d' % item for item in stats['sources'].items()))
+    if stats['random_by_move']:
+        lines.append('random replies by black move: '
+                     + ', '.join('%d: %d' % item for item in sorted(stats['random_by_move'].items())))
+    lines.append('  id   found  threat  chosen  decomp    wins  losses  win%   get_move ms')
+    for pattern_id, entry in sorted(stats['patterns'].items()):
+        games = entry['wins'] + entry['losses']
+        replies = entry['threatened'] + entry['chosen']
+        lines.append('  %-3d %6d %7d %7d %7d %7d %7d %5s %8.3f'
+                     % (pattern_id, entry['found'], entry['threatened'], entry['chosen'], entry['decomposed'],
+                        entry['wins'], entry['losses'],
+                        '%.0f' % (100 * entry['wins'] / games) if games else '-',
+                        1000 * entry['seconds'] / replies if replies else 0.0))
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a game record archive against the current patterns")
+    parser.add_argument('path')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of cores")
+    selfplay.add_player_arguments(parser)
+    parser.add_argument('--output', help="write the stats to this JSON file")
+    args = parser.parse_args(argv)
+
+    options = selfplay.player_options(args)
+    start = time.perf_counter()
+    stats = run_analysis(args.path, args.seed, args.workers, options)
+    seconds = time.perf_counter() - start
+    print(format_stats(stats))
+    print('%d games in %.1f s, %.0f games/s' % (stats['games'], seconds, stats['games'] / seconds if seconds else 0))
+
+    if args.output:
+        report = {'config': vars(args), 'seconds': seconds, 'stats': stats}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
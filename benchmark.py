@@ -0,0 +1,134 @@
+# Self-play benchmark
+#
+# Plays seeded games between the pattern player (black) and a random or
+# scripted white player and reports how fast black replies:
+#   moves/sec    - white moves answered per second of reply time
+#   p50/p99      - reply latency, the time place_stone takes for a white move
+#   split        - time spent inside detect_win, find_substrategies and
+#                  search_strategies
+# The results are printed and, with --output, written as JSON so two runs can
+# be compared.
+#
+# Example: python benchmark.py --sizes 5 8 11 --games 200 --output run.json
+
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import patterns
+import selfplay
+
+# HexBoard methods whose share of the reply time is reported
+TIMED_METHODS = ('detect_win', 'find_substrategies', 'search_strategies')
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a sorted list
+    if not values:
+        return 0.0
+    rank = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[rank]
+
+def time_methods(board, totals, replying):
+    # Replaces the timed methods on this board with wrappers that add their
+    # running time to totals while replying[0] is set. place_stone looks the
+    # methods up on the board, so the wrappers see every call it makes
+    for name in TIMED_METHODS:
+        method = getattr(board, name)
+        def timed(*args, method=method, name=name):
+            if not replying[0]:
+                return method(*args)
+            start = time.perf_counter()
+            try:
+                return method(*args)
+            finally:
+                totals[name] += time.perf_counter() - start
+        setattr(board, name, timed)
+
+def make_player(kind, seed, script):
+    if kind == 'scripted':
+        return selfplay.ScriptedPlayer(script, selfplay.RandomPlayer(seed))
+    return selfplay.PLAYERS[kind](seed)
+
+def run_size(board_dimension, games, seed, player, script=(), options=None):
+    # Plays the games on one board size and returns its results. options
+    # are black's engines, see selfplay.configure_board
+    latencies = []
+    totals = dict.fromkeys(TIMED_METHODS, 0.0)
+    wins = {patterns.BLACK: 0, patterns.WHITE: 0}
+    # Only calls made while black replies are timed, not the win checks of
+    # the game loop itself
+    replying = [False]
+
+    def timed_move(board, x, y):
+        replying[0] = True
+        start = time.perf_counter()
+        board.place_stone(x, y, patterns.WHITE)
+        latencies.append(time.perf_counter() - start)
+        replying[0] = False
+
+    for game in range(games):
+        game_seed = seed + game
+        board = selfplay.configure_board(patterns.HexBoard(board_dimension), options, game_seed)
+        time_methods(board, totals, replying)
+        winner, board = selfplay.play_game(board_dimension, make_player(player, game_seed, script),
+                                           seed=game_seed, board=board, play_move=timed_move)
+        wins[winner] += 1
+
+    reply_time = sum(latencies)
+    latencies.sort()
+    return {
+        'board_dimension': board_dimension,
+        'games': games,
+        'black_wins': wins[patterns.BLACK],
+        'white_wins': wins[patterns.WHITE],
+        'moves': len(latencies),
+        'reply_seconds': reply_time,
+        'moves_per_second': len(latencies) / reply_time if reply_time else 0.0,
+        'latency_p50_ms': percentile(latencies, 0.50) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+        'latency_max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'split_seconds': totals,
+    }
+
+def format_result(result):
+    split = ', '.join('%s %.1f%%' % (name, 100 * seconds / result['reply_seconds'] if result['reply_seconds'] else 0)
+                      for name, seconds in result['split_seconds'].items())
+    return ('%dx%d: %d games, %d moves, %.0f moves/s, p50 %.3f ms, p99 %.3f ms, black %d white %d\n    %s'
+            % (result['board_dimension'], result['board_dimension'], result['games'], result['moves'],
+               result['moves_per_second'], result['latency_p50_ms'], result['latency_p99_ms'],
+               result['black_wins'], result['white_wins'], split))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pattern player in self-play")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3, 4, 5, 8])
+    parser.add_argument('--games', type=int, default=100, help="games per board size")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--player', choices=sorted(selfplay.PLAYERS) + ['scripted'], default='random',
+                        help="white player, scripted plays --script then random moves")
+    parser.add_argument('--script', default='', help="comma separated white moves, e.g. c3,d4")
+    selfplay.add_player_arguments(parser)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    script = [move for move in args.script.split(',') if move]
+    report = {
+        'config': vars(args),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': [],
+    }
+    for board_dimension in args.sizes:
+        result = run_size(board_dimension, args.games, args.seed, args.player, script,
+                          selfplay.player_options(args))
+        report['results'].append(result)
+        print(format_result(result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+if __name__ == "__main__":
+    main()
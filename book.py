@@ -0,0 +1,199 @@
+# Opening book
+#
+# Black's replies for the first plies of a game, worked out offline and
+# stored by position. The file is
+#   header  - magic, format version, board size, entry count and the digest
+#             of the Zobrist keys the entries were hashed with, '<8sHHIQ'
+#   entries - sorted by key, each '<QH': the Zobrist hash of the canonical
+#             position (see symmetry.py) and the cell of the reply in the
+#             canonical orientation
+# and is read through mmap with a binary search, so opening a book costs
+# nothing, lookups take a few dozen byte reads and every process using the
+# same book shares its pages. A book whose digest differs from the keys of
+# geometry.py (see BoardGeometry.zobrist_digest) is refused, its keys would
+# find nothing or the wrong positions.
+#
+# A position's mirror images share one entry, the reply is mapped back to
+# the board's orientation with the transform that gave the canonical form.
+# Books are generated for one board size by walking every position black
+# can face in the first plies, black playing the book's own replies and
+# white playing anything, and asking an engine for each reply. The default
+# engine is the search in mcts.py, the resistance evaluator alone values the
+# edge cells too highly to choose opening moves.
+#
+# A HexBoard uses a book once one is set as its book, see HexBoard.book_move.
+#
+# Example: python book.py --size 11 --plies 5 --output books/book11.bin
+
+import argparse
+import mmap
+import os
+import struct
+import time
+import geometry
+import mcts
+import patterns
+import symmetry
+
+MAGIC = b'HEXBOOK\0'
+VERSION = 2
+HEADER = struct.Struct('<8sHHIQ')
+ENTRY = struct.Struct('<QH')
+# Playouts per reply for the default engine
+BOOK_PLAYOUTS = 20000
+
+# Books in the books directory next to this file, by board size
+BOOK_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'books')
+
+class Book():
+    # magic tells apart the kinds of tables kept in this format, see tables.py
+    def __init__(self, path, magic=MAGIC):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise ValueError("%s has no header" % path)
+        file_magic, version, board_dimension, count, digest = HEADER.unpack_from(self.data, 0)
+        if file_magic != magic or version != VERSION:
+            raise ValueError("%s is not a version %d %s file" % (path, VERSION, magic.rstrip(b'\0').decode()))
+        if len(self.data) != HEADER.size + count*ENTRY.size:
+            raise ValueError("%s is truncated" % path)
+        self.board_dimension = board_dimension
+        self.count = count
+        self.symmetry = symmetry.get_symmetry(board_dimension)
+        if digest != self.symmetry.geometry.zobrist_digest:
+            raise ValueError("%s was hashed with different Zobrist keys" % path)
+
+    def find(self, key):
+        # The cell stored for key, or None
+        data = self.data
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_key, cell = ENTRY.unpack_from(data, HEADER.size + middle*ENTRY.size)
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                return cell
+        return None
+
+    def find_position(self, board):
+        # The value stored for a HexBoard's position and the transform from
+        # the board to the canonical position, or None
+        if board.board_dimension != self.board_dimension:
+            return None
+        key, transform = self.symmetry.canonical_hash(board.black_bits, board.white_bits, board.to_move)
+        value = self.find(key)
+        if value is None:
+            return None
+        return value, transform
+
+    def lookup(self, board):
+        # The book's reply for the side to move on board as x,y, or None
+        found = self.find_position(board)
+        if found is None:
+            return None
+        cell = self.symmetry.transform_cell(found[0], found[1])
+        if not board.empty_bits >> cell & 1:
+            # A hash collision with a position that isn't in the book
+            return None
+        return patterns.index_2_coord(cell, self.board_dimension)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data.close()
+
+# Books already opened in this process, by path
+open_books = {}
+
+def open_book(path):
+    # Opens a book once per process
+    book = open_books.get(path)
+    if book is None:
+        book = open_books[path] = Book(path)
+    return book
+
+def book_path(board_dimension):
+    return os.path.join(BOOK_DIRECTORY, 'book%d.bin' % board_dimension)
+
+def default_book(board_dimension):
+    # The shipped book for a board size, or None if there is none
+    path = book_path(board_dimension)
+    if not os.path.exists(path):
+        return None
+    return open_book(path)
+
+def write_book(path, board_dimension, entries, magic=MAGIC):
+    # Writes a book from a dict of canonical key to cell
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        digest = geometry.get_geometry(board_dimension).zobrist_digest
+        f.write(HEADER.pack(magic, VERSION, board_dimension, len(entries), digest))
+        for key in sorted(entries):
+            f.write(ENTRY.pack(key, entries[key]))
+
+def generate(board_dimension, plies, choose=None, progress=None, playouts=BOOK_PLAYOUTS, seed=0):
+    # Works out the book entries for every position black faces in the first
+    # plies of a game. choose(board) returns black's reply as x,y, by default
+    # the move found by an MCTS search of playouts playouts. Returns a dict
+    # of canonical key to cell
+    if choose is None:
+        search = mcts.MCTS(playouts=playouts, seed=seed)
+        choose = lambda board: search.choose(board, patterns.BLACK)
+    n = board_dimension
+    sym = symmetry.get_symmetry(n)
+    entries = {}
+    seen = set()
+    positions = [patterns.HexBoard(n)]
+    # Each round gives black's reply in every position, then every white
+    # answer to it makes the positions of the next round
+    for ply in range(0, plies, 2):
+        next_positions = []
+        for board in positions:
+            key, transform = sym.canonical_hash(board.black_bits, board.white_bits, board.to_move)
+            if key in entries:
+                continue
+            x, y = choose(board)
+            entries[key] = sym.transform_cell(y*n + x, transform)
+            if progress is not None:
+                progress(len(entries))
+            if ply + 1 >= plies:
+                continue
+            board.set_stone(x, y, patterns.BLACK)
+            if board.detect_win() != 0:
+                continue
+            for white_x, white_y in list(board.unoccupied):
+                reply = board.clone()
+                reply.set_stone(white_x, white_y, patterns.WHITE)
+                if reply.detect_win() != 0:
+                    continue
+                position = sym.canonical(reply.black_bits, reply.white_bits, reply.to_move)[0]
+                if position not in seen:
+                    seen.add(position)
+                    next_positions.append(reply)
+        positions = next_positions
+    return entries
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate an opening book")
+    parser.add_argument('--size', type=int, required=True)
+    parser.add_argument('--plies', type=int, default=3, help="plies from the empty board the book covers")
+    parser.add_argument('--playouts', type=int, default=BOOK_PLAYOUTS, help="MCTS playouts per reply")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="defaults to books/book<size>.bin")
+    args = parser.parse_args(argv)
+
+    path = args.output or book_path(args.size)
+    start = time.perf_counter()
+    entries = generate(args.size, args.plies, playouts=args.playouts, seed=args.seed)
+    write_book(path, args.size, entries)
+    print('%d positions written to %s in %.1f s' % (len(entries), path, time.perf_counter() - start))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Board coordinates
+#
+# Converts between x,y coordinates and board positions such as 'c5'. Columns
+# are lettered a-z, then aa, ab, ... like spreadsheet columns so boards wider
+# than 26 still get a unique name per column, and rows are numbered from 1.
+#
+# Every position string up to MAX_DIMENSION is built once at import and
+# interned, so converting is a dict lookup and equal positions are the same
+# object.
+
+import sys
+
+# Largest board side the tables cover
+MAX_DIMENSION = 64
+
+def column_name(x):
+    # Returns the letters of the 0-indexed column x
+    name = ''
+    x += 1
+    while x > 0:
+        x, remainder = divmod(x-1, 26)
+        name = chr(ord('a') + remainder) + name
+    return name
+
+COLUMN_NAMES = tuple(sys.intern(column_name(x)) for x in range(MAX_DIMENSION))
+COLUMN_INDEX = {name: x for x, name in enumerate(COLUMN_NAMES)}
+
+# x,y to position and back
+POSITIONS = {}
+COORDINATES = {}
+for x in range(MAX_DIMENSION):
+    for y in range(MAX_DIMENSION):
+        pos = sys.intern(COLUMN_NAMES[x] + str(y+1))
+        POSITIONS[(x,y)] = pos
+        COORDINATES[pos] = (x,y)
+
+def coord_2_pos(x, y):
+    # Changes a coordinate into board coordinate form
+    return POSITIONS[(x,y)]
+
+def pos_2_coord(pos):
+    # Changes a board coordinate into normal coordinates
+    return COORDINATES[pos]
+
+def parse_pos(pos, board_dimension):
+    # Reads a position typed by a player, returns its coordinates or None if
+    # it isn't a cell of a board with the given size
+    coord = COORDINATES.get(pos.strip().lower())
+    if coord is None or coord[0] >= board_dimension or coord[1] >= board_dimension:
+        return None
+    return coord
+
+def column_header(board_dimension):
+    # Returns the column letters of a board, each preceded by a space
+    return ''.join(' ' + COLUMN_NAMES[x] for x in range(board_dimension))
+
+# Positions of each board size in cell index (y*n + x) order
+index_positions = {}
+
+def positions_by_index(board_dimension):
+    # Returns a tuple mapping each cell index of the board size to its position
+    positions = index_positions.get(board_dimension)
+    if positions is None:
+        n = board_dimension
+        positions = tuple(POSITIONS[(index % n, index // n)] for index in range(n*n))
+        index_positions[board_dimension] = positions
+    return positions
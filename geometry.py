@@ -0,0 +1,130 @@
+# Board geometry
+#
+# Everything about a board that only depends on its size: cell masks, edge
+# masks, neighbours, bridges, 432 templates and the compiled pattern
+# templates. It is built once per board dimension by get_geometry and shared by
+# every HexBoard of that size, so nothing here may be modified by a board.
+#
+# Cells are indexed as y*n + x, the per-cell tables are tuples in that order.
+
+import hashlib
+import random
+import struct
+import coords
+import templates
+
+# Seed of the Zobrist keys, fixed so a position hashes the same in every run
+ZOBRIST_SEED = 0x486578
+
+class BoardGeometry():
+    def __init__(self, board_dimension):
+        n = board_dimension
+        self.board_dimension = n
+        self.cell_count = n*n
+        self.full_mask = (1 << self.cell_count) - 1
+
+        # Coordinates of every cell, in index order and in the x-major order
+        # HexBoard has always listed its unoccupied cells in
+        self.coords = tuple((index % n, index // n) for index in range(self.cell_count))
+        self.column_major_coords = tuple((x,y) for x in range(n) for y in range(n))
+        # Position string of every cell, and the index of every position
+        self.positions = coords.positions_by_index(n)
+        self.position_index = {pos: index for index, pos in enumerate(self.positions)}
+
+        # Fixed masks for the board edges and single cells
+        self.first_column_mask = 0
+        self.last_column_mask = 0
+        self.first_row_mask = (1 << n) - 1
+        self.last_row_mask = self.first_row_mask << (n*(n-1))
+        self.black_edge_mask = 0
+        cell_masks = {}
+        for x, y in self.coords:
+            bit = 1 << (y*n + x)
+            cell_masks[(x,y)] = bit
+            if x == 0:
+                self.first_column_mask |= bit
+            if x == n - 1:
+                self.last_column_mask |= bit
+            if y == 0 or y == n - 1:
+                self.black_edge_mask |= bit
+        self.cell_masks = cell_masks
+
+        # BLACK_EDGE is true if the cell is either the first or last row,
+        # WHITE_EDGE if it is the first or last column
+        self.black_edge = tuple(y == 0 or y == n-1 for x, y in self.coords)
+        self.white_edge = tuple(x == 0 or x == n-1 for x, y in self.coords)
+
+        # Neighbour mask of every cell
+        self.neighbour_masks = tuple(self.neighbours_of(1 << index) for index in range(self.cell_count))
+
+        # The same neighbours as coordinate lists, in the order HexCell has
+        # always returned them. Bridges only point forward so a bridge between
+        # two stones is listed by one of them
+        self.neighbour_coords = tuple(self.on_board([(x+1,y), (x+1,y-1), (x,y+1), (x,y-1), (x-1,y), (x-1,y+1)])
+                                      for x, y in self.coords)
+        self.bridge_coords = tuple(self.on_board([(x+1,y+1), (x-1,y+2), (x-2,y+1)])
+                                   for x, y in self.coords)
+        self.four32 = tuple(self.generate_432_patterns(x, y) for x, y in self.coords)
+
+        # Pattern templates compiled for this size, see templates.py
+        self.templates = templates.compile_templates(n)
+
+        # Zobrist keys, a random 64 bit key per cell and colour and one for
+        # white being the side to move. A board's hash is the XOR of the keys
+        # of its stones
+        rng = random.Random(ZOBRIST_SEED * 1000 + n)
+        self.black_keys = tuple(rng.getrandbits(64) for index in range(self.cell_count))
+        self.white_keys = tuple(rng.getrandbits(64) for index in range(self.cell_count))
+        self.white_to_move_key = rng.getrandbits(64)
+        # A 64 bit digest of all the keys, files of hashed positions store it
+        # so they are never read with other keys, see book.py
+        keys = self.black_keys + self.white_keys + (self.white_to_move_key,)
+        digest = hashlib.blake2b(struct.pack('<%dQ' % len(keys), *keys), digest_size=8).digest()
+        self.zobrist_digest = int.from_bytes(digest, 'little')
+
+        # Starting disjoint-set forest, every cell and the four edge nodes
+        # are their own root
+        self.initial_parent = tuple(range(self.cell_count + 4))
+
+    def on_board(self, cells):
+        # Returns the cells that are on the board, as a tuple
+        n = self.board_dimension
+        return tuple(cell for cell in cells if 0 <= cell[0] < n and 0 <= cell[1] < n)
+
+    def neighbours_of(self, mask):
+        # Returns the mask of all cells neighbouring the cells in mask. Each
+        # hex direction is one shift, the column masks stop a shift from
+        # wrapping a cell onto the next or previous row
+        return (self.up_down_neighbours_of(mask)
+                | ((mask << 1) & ~self.first_column_mask)
+                | ((mask >> 1) & ~self.last_column_mask)) & self.full_mask & ~mask
+
+    def up_down_neighbours_of(self, mask):
+        # Returns the mask of cells neighbouring mask in the row above or below,
+        # the only neighbours that count for connected_ud_pattern
+        n = self.board_dimension
+        return ((mask << n)
+                | (mask >> n)
+                | ((mask >> (n-1)) & ~self.first_column_mask)
+                | ((mask << (n-1)) & ~self.last_column_mask)) & self.full_mask
+
+    def generate_432_patterns(self, x, y):
+        # Generates top to bottom 432 patterns, leaving out any that don't fit
+        # on the board
+        four32 = [((x-1,y+1),(x-2,y+2),(x-1,y+2), (x+1,y+1),(x+1,y),(x,y+1),(x,y+2),(x+1,y+2)),
+                  ((x,y+1),(x,y+2),(x-1,y+2), (x-2,y+1),(x-1,y),(x-1,y+1),(x-3,y+2),(x-2,y+2)),
+                  ((x,y-1),(x,y-2),(x+1,y-2), (x+2,y-1),(x+1,y),(x+1,y-1),(x+2,y-2),(x+3,y-2)),
+                  ((x+1,y-1),(x+1,y-2),(x+2,y-2), (x-1,y-1),(x-1,y),(x,y-1),(x-1,y-2),(x,y-2))]
+        return tuple(pattern for pattern in four32 if len(self.on_board(pattern)) == 8)
+
+# Geometry of every board size built so far
+geometries = {}
+
+def get_geometry(board_dimension):
+    # Returns the shared geometry for the given board size, building it the
+    # first time that size is asked for
+    geometry = geometries.get(board_dimension)
+    if geometry is None:
+        geometry = BoardGeometry(board_dimension)
+        geometries[board_dimension] = geometry
+    return geometry
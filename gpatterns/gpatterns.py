@@ -114,6 +114,8 @@ class HexBoard():
 
 class HexCell():
     # initialize cell with coordinates and ownership
+    __slots__ = ('x', 'y', 'owner')
+
     def __init__(self, x, y, owner=UNOCCUPIED):
         self.x = x
         self.y = y
@@ -0,0 +1,397 @@
+# H-search
+#
+# Builds black's virtual connections the way Anshelevich's H-search does,
+# instead of matching a fixed list of shapes. The bridge, edge bridge, 432 and
+# the other hand-coded templates are all connections it derives.
+#
+# The nodes are black groups, black's two edges and empty cells. A connection
+# between two nodes has a carrier, a bitset of empty cells (bit y*n + x):
+#   - a virtual connection (VC) holds even if white moves first, as long as
+#     black answers every white move in the carrier inside the carrier
+#   - a semi-virtual connection (SC) holds if black moves first, at its key
+# Two nodes next to each other have a VC with an empty carrier. From there:
+#   AND - VCs x-z and z-y with disjoint carriers give a VC x-y through a black
+#         group z, or an SC x-y with key z through an empty cell z
+#   OR  - SCs x-y whose carriers have nothing in common give a VC x-y with the
+#         union of the carriers as its carrier, white can't break them all
+# Apart from neighbouring cells every connection has a black group or edge on
+# at least one end, connections between two empty cells would outnumber all
+# the others and black only ever needs them as a step between its own nodes.
+# Carriers larger than max_carrier are dropped, and a pair keeps at most
+# max_vcs VCs and max_scs SCs, the smallest carriers first, which keeps the
+# search fast enough to run after every move.
+#
+# The connections are updated as stones are played rather than rebuilt:
+#   - a white stone removes its cell and every connection whose carrier uses it
+#   - a black stone merges its cell and the groups around it into one node,
+#     its connections and the ones whose carrier used the cell are moved over
+#     and shrunk, an SC keyed on it becomes a VC, and only those are combined
+#     again
+#
+# A HexBoard uses an HSearch once one is attached with attach. Every VC
+# between two black nodes then becomes a substrategy with pattern id 18, its
+# carrier as the cells, and when white plays in one black answers with the
+# key of an SC between the same nodes that white's stone didn't break.
+
+import geometry
+import patterns
+
+# Pattern id of the substrategies made from the connections
+HSEARCH_PATTERN = 18
+# Largest carrier kept, in cells
+MAX_CARRIER = 10
+# Most connections of each kind kept per pair of nodes
+MAX_VCS = 4
+MAX_SCS = 8
+# How many SCs the OR rule combines at most
+OR_DEPTH = 4
+
+class HSearch():
+    def __init__(self, board_dimension, max_carrier=MAX_CARRIER, max_vcs=MAX_VCS,
+                 max_scs=MAX_SCS, or_depth=OR_DEPTH):
+        n = board_dimension
+        self.board_dimension = n
+        self.max_carrier = max_carrier
+        self.max_vcs = max_vcs
+        self.max_scs = max_scs
+        self.or_depth = or_depth
+        # Edge nodes, numbered like HexBoard's virtual edge nodes
+        self.top = n*n
+        self.bottom = n*n + 1
+        self.neighbours = tuple(tuple(y*n + x for x, y in cells)
+                                for cells in geometry.get_geometry(n).neighbour_coords)
+        self.compute(0, 0)
+
+    def compute(self, black_bits, white_bits):
+        # Rebuilds every connection for a position from scratch
+        n = self.board_dimension
+        self.black_bits = black_bits
+        self.white_bits = white_bits
+        # Every node merged into another one points at it, see find
+        self.merged = {}
+        # Connections by pair of nodes, the smaller node first. VCs are
+        # carriers, SCs are (carrier, key)
+        self.vcs = {}
+        self.scs = {}
+        # The nodes each node has a VC with
+        self.links = {}
+        # Every pair of nodes a record was made for, by carrier. A record only
+        # holds its cells, so VCs between different pairs with the same
+        # carrier give equal records and all their pairs are kept
+        self.records = {}
+        self.worklist = []
+
+        # Black groups, named by their edge or else their smallest cell
+        for index in range(n*n):
+            if black_bits >> index & 1 and index not in self.merged:
+                self.merged[index] = index
+                group = [index]
+                for cell in group:
+                    for neighbour in self.neighbours[cell]:
+                        if black_bits >> neighbour & 1 and neighbour not in self.merged:
+                            self.merged[neighbour] = index
+                            group.append(neighbour)
+                edges = set()
+                for cell in group:
+                    edges.update(self.edges_of(cell))
+                if edges:
+                    name = min(edges)
+                    for edge in edges:
+                        if edge != name:
+                            self.merged[edge] = name
+                    for cell in group:
+                        self.merged[cell] = name
+        for node in list(self.merged):
+            if self.merged[node] == node:
+                del self.merged[node]
+
+        # Nodes next to each other have a VC with an empty carrier
+        empty_bits = ~(black_bits | white_bits)
+        for index in range(n*n):
+            if empty_bits >> index & 1:
+                for neighbour in self.neighbours[index]:
+                    if black_bits >> neighbour & 1:
+                        self.add_vc(index, self.find(neighbour), 0)
+                    elif empty_bits >> neighbour & 1 and neighbour > index:
+                        self.add_vc(index, neighbour, 0)
+                for edge in self.edges_of(index):
+                    self.add_vc(index, self.find(edge), 0)
+        self.close()
+
+    def edges_of(self, index):
+        # The black edges a cell touches
+        n = self.board_dimension
+        edges = []
+        if index < n:
+            edges.append(self.top)
+        if index >= n*(n-1):
+            edges.append(self.bottom)
+        return edges
+
+    def find(self, node):
+        # The node a cell, group or edge is part of now
+        merged = self.merged
+        while node in merged:
+            node = merged[node]
+        return node
+
+    def is_cell(self, node):
+        # True for an empty cell, false for a black group or an edge
+        return node < self.top and not self.black_bits >> node & 1
+
+    def node_bit(self, node):
+        # The carrier bit of an empty cell node, 0 for other nodes
+        return 1 << node if self.is_cell(node) else 0
+
+    def add_vc(self, node1, node2, carrier):
+        # Adds a VC unless one with a subset of its carrier is known, and
+        # drops the ones it makes redundant
+        if node1 == node2 or carrier.bit_count() > self.max_carrier:
+            return
+        if carrier and self.is_cell(node1) and self.is_cell(node2):
+            return
+        pair = (node1, node2) if node1 < node2 else (node2, node1)
+        known = self.vcs.get(pair)
+        if known is None:
+            known = self.vcs[pair] = []
+            self.links.setdefault(node1, set()).add(node2)
+            self.links.setdefault(node2, set()).add(node1)
+        for other in known:
+            if other & carrier == other:
+                return
+        known[:] = [other for other in known if other & carrier != carrier]
+        if len(known) >= self.max_vcs:
+            if carrier.bit_count() >= known[-1].bit_count():
+                return
+            known.pop()
+        known.append(carrier)
+        known.sort(key=int.bit_count)
+        scs = self.scs.get(pair)
+        if scs:
+            scs[:] = [sc for sc in scs if sc[0] & carrier != carrier]
+        self.worklist.append((pair, carrier))
+
+    def add_sc(self, node1, node2, carrier, key):
+        # Adds an SC unless a VC or SC with a subset of its carrier is known,
+        # then tries the OR rule with it
+        if node1 == node2 or carrier.bit_count() > self.max_carrier:
+            return
+        if self.is_cell(node1) and self.is_cell(node2):
+            return
+        pair = (node1, node2) if node1 < node2 else (node2, node1)
+        for other in self.vcs.get(pair, ()):
+            if other & carrier == other:
+                return
+        known = self.scs.setdefault(pair, [])
+        for other, other_key in known:
+            if other & carrier == other:
+                return
+        known[:] = [sc for sc in known if sc[0] & carrier != carrier]
+        if len(known) >= self.max_scs:
+            if carrier.bit_count() >= known[-1][0].bit_count():
+                return
+            known.pop()
+        known.append((carrier, key))
+        known.sort(key=lambda sc: sc[0].bit_count())
+        self.combine_or(pair, list(known), carrier, carrier, 0, self.or_depth - 1)
+
+    def combine_or(self, pair, scs, union, intersection, start, depth):
+        # OR rule, adds a VC for every set of SCs, the last one added
+        # included, whose carriers have no cell in common
+        for i in range(start, len(scs)):
+            carrier = scs[i][0]
+            common = intersection & carrier
+            if common == intersection:
+                continue
+            joined = union | carrier
+            if joined.bit_count() > self.max_carrier:
+                continue
+            if not common:
+                self.add_vc(pair[0], pair[1], joined)
+            elif depth > 1:
+                self.combine_or(pair, scs, joined, common, i + 1, depth - 1)
+
+    def close(self):
+        # AND rule, combines every VC added since the last call with the VCs
+        # on both of its ends until nothing new is found
+        worklist = self.worklist
+        while worklist:
+            pair, carrier = worklist.pop()
+            if carrier not in self.vcs.get(pair, ()):
+                continue
+            for middle, end in (pair, pair[::-1]):
+                middle_is_cell = self.is_cell(middle)
+                end_is_cell = self.is_cell(end)
+                end_bit = 1 << end if end_is_cell else 0
+                for other in list(self.links.get(middle, ())):
+                    if other == end or end_is_cell and self.is_cell(other):
+                        continue
+                    if carrier & self.node_bit(other):
+                        continue
+                    joined_pair = (middle, other) if middle < other else (other, middle)
+                    for other_carrier in list(self.vcs.get(joined_pair, ())):
+                        if other_carrier & carrier or other_carrier & end_bit:
+                            continue
+                        if middle_is_cell:
+                            self.add_sc(end, other, carrier | other_carrier | 1 << middle, middle)
+                        else:
+                            self.add_vc(end, other, carrier | other_carrier)
+
+    def play(self, index, state):
+        # Updates the connections for a stone put on the empty cell index
+        if state == patterns.WHITE:
+            self.white_bits |= 1 << index
+            self.remove_cell(index)
+        else:
+            self.black_bits |= 1 << index
+            self.merge_cell(index)
+        self.close()
+
+    def remove_cell(self, index):
+        # Drops the node of a cell white took and every connection using it
+        bit = 1 << index
+        for other in self.links.pop(index, ()):
+            pair = (index, other) if index < other else (other, index)
+            self.vcs.pop(pair, None)
+            self.links[other].discard(index)
+        for pair in [pair for pair in self.scs if index in pair]:
+            del self.scs[pair]
+        for pair, known in list(self.vcs.items()):
+            if any(carrier & bit for carrier in known):
+                known[:] = [carrier for carrier in known if not carrier & bit]
+                if not known:
+                    self.drop_pair(pair)
+        for pair, known in list(self.scs.items()):
+            if any(carrier & bit for carrier, key in known):
+                known[:] = [sc for sc in known if not sc[0] & bit]
+                if not known:
+                    del self.scs[pair]
+
+    def drop_pair(self, pair):
+        del self.vcs[pair]
+        self.links[pair[0]].discard(pair[1])
+        self.links[pair[1]].discard(pair[0])
+
+    def merge_cell(self, index):
+        # Merges the cell black took with the groups and edges next to it.
+        # Every connection of the merged nodes, or with the cell in its
+        # carrier, is taken out and added again for the new node with the
+        # cell out of its carrier
+        bit = 1 << index
+        merged_nodes = {index}
+        for neighbour in self.neighbours[index]:
+            if self.black_bits >> neighbour & 1:
+                merged_nodes.add(self.find(neighbour))
+        for edge in self.edges_of(index):
+            merged_nodes.add(self.find(edge))
+        edges = [node for node in merged_nodes if node >= self.top]
+        if edges:
+            name = min(edges)
+        else:
+            name = min(merged_nodes)
+        for node in merged_nodes:
+            if node != name:
+                self.merged[node] = name
+
+        def rename(node):
+            return name if node in merged_nodes else node
+
+        moved_vcs = []
+        moved_scs = []
+        for pair in list(self.vcs):
+            known = self.vcs[pair]
+            if pair[0] in merged_nodes or pair[1] in merged_nodes or any(carrier & bit for carrier in known):
+                moved_vcs.extend((rename(pair[0]), rename(pair[1]), carrier & ~bit) for carrier in known)
+                self.drop_pair(pair)
+        for pair in list(self.scs):
+            known = self.scs[pair]
+            if pair[0] in merged_nodes or pair[1] in merged_nodes or any(sc[0] & bit for sc in known):
+                moved_scs.extend((rename(pair[0]), rename(pair[1]), carrier & ~bit, key) for carrier, key in known)
+                del self.scs[pair]
+        for node in merged_nodes:
+            if not self.links.get(node):
+                self.links.pop(node, None)
+
+        for node1, node2, carrier in moved_vcs:
+            self.add_vc(node1, node2, carrier)
+        for node1, node2, carrier, key in moved_scs:
+            if key == index:
+                # Black has played the key, the SC is now a VC
+                self.add_vc(node1, node2, carrier)
+            else:
+                self.add_sc(node1, node2, carrier, key)
+
+    def black_nodes(self, pair):
+        # True if both ends of a pair are black groups or edges
+        return not self.is_cell(pair[0]) and not self.is_cell(pair[1])
+
+    def connected(self):
+        # True if black's edges have a VC, the game is then won for black
+        top, bottom = self.find(self.top), self.find(self.bottom)
+        return top == bottom or bool(self.vcs.get((top, bottom)))
+
+    def record(self, node1, node2, carrier):
+        # The substrategy for a VC, remembered so a reply can find its nodes
+        cells = tuple(patterns.mask_indices(carrier))
+        record = patterns.Substrategy(HSEARCH_PATTERN, cells)
+        pairs = self.records.setdefault(carrier, [])
+        if (node1, node2) not in pairs:
+            pairs.append((node1, node2))
+        return record
+
+    def substrategies(self):
+        # A substrategy for the smallest VC between every two black nodes
+        records = []
+        for pair, known in self.vcs.items():
+            if known and known[0] and self.black_nodes(pair):
+                records.append(self.record(pair[0], pair[1], known[0]))
+        return records
+
+    def reply(self, record, white_move):
+        # Black's answer to a white stone in the carrier of a record, the key
+        # of an SC between the nodes of a VC with that carrier that is still
+        # there, trying every pair the record was made for. Returns the cell
+        # index of the key and the record of the VC it gives. Raises
+        # ValueError when there is nothing to answer with
+        carrier = sum(1 << cell for cell in record.cells)
+        if carrier not in self.records:
+            raise ValueError("no connection for this substrategy")
+        for node1, node2 in self.records[carrier]:
+            node1, node2 = self.find(node1), self.find(node2)
+            if node1 == node2:
+                # This connection is already made
+                continue
+            pair = (node1, node2) if node1 < node2 else (node2, node1)
+            for sc_carrier, key in self.scs.get(pair, ()):
+                if not self.black_bits >> key & 1 and not self.white_bits >> key & 1:
+                    remaining = sc_carrier & ~(1 << key)
+                    return key, self.record(node1, node2, remaining) if remaining else None
+        raise ValueError("the connection is lost")
+
+    def copy(self):
+        # Returns an independent copy of the connections
+        other = HSearch.__new__(HSearch)
+        other.__dict__.update(self.__dict__)
+        other.merged = dict(self.merged)
+        other.vcs = {pair: list(known) for pair, known in self.vcs.items()}
+        other.scs = {pair: list(known) for pair, known in self.scs.items()}
+        other.links = {node: set(nodes) for node, nodes in self.links.items()}
+        other.records = self.copy_records()
+        other.worklist = []
+        return other
+
+    def copy_records(self, records=None):
+        # An independent copy of the records, or of records if given. compute
+        # clears them, so a board that rebuilds the connections keeps a copy
+        # to put back
+        if records is None:
+            records = self.records
+        return {carrier: list(pairs) for carrier, pairs in records.items()}
+
+def attach(board, **options):
+    # Builds an HSearch for the board's position and sets it as the board's
+    # hsearch, options are passed on to HSearch
+    search = HSearch(board.board_dimension, **options)
+    search.compute(board.black_bits, board.white_bits)
+    board.hsearch = search
+    return search
@@ -1,9 +1,9 @@
+import coords
 import patterns
 def main():
     n = 8
     # create an empty nxn Hex board
     board_nxn = patterns.HexBoard(n)
-    pos_dict = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7}
     board_nxn.place_stone(1, 6, 1) ######## MAIN POSITION ########
     
     ##board_nxn.place_stone(3,6,2)
@@ -22,13 +22,11 @@ def main():
         print("\n")
         pos = input("Enter move (ie a2): ")
         color = 2
-        try:
-            assert pos[0] in pos_dict
-            assert 1 <= int(pos[1::]) <= n
-        except:
+        coord = coords.parse_pos(pos, n)
+        if coord is None:
             print("Invalid values")
         else:
-            board_nxn.place_stone(pos_dict[pos[0]], int(pos[1])-1, color)
+            board_nxn.place_stone(coord[0], coord[1], color)
             print(board_nxn)
             if board_nxn.detect_win() == 0:
                 print("Nobody wins")
@@ -0,0 +1,199 @@
+# Monte Carlo tree search
+#
+# A UCT move selector for positions that the patterns have no answer for.
+# Each iteration walks down the tree picking the child with the best upper
+# confidence bound, adds the children of the node it ends on and plays the
+# rest of the game out at random.
+#
+# Playouts use a bytearray of cell states instead of a HexBoard. They fill
+# every empty cell, alternating colours, and only then look for the winner.
+# A full Hex board always has exactly one winner, and stones played after a
+# chain is connected can't change it, so there is no win check per move,
+# only one search from black's first row at the end.
+#
+# The search stops after a number of playouts, a number of seconds, or
+# whichever comes first when both are given. With priors on, the root moves
+# that lie in one of black's substrategies start with prior_visits made up
+# visits at a win rate of prior_value, so the search looks at the pattern
+# cells first and the patterns still give way if the playouts disagree.
+#
+# A HexBoard uses an MCTS once one is set as its mcts, see
+# HexBoard.fallback_move. selfplay.MCTSPlayer plays white with it.
+
+import math
+import random
+import time
+import geometry
+import patterns
+
+# Budget used when neither playouts nor seconds is given
+DEFAULT_PLAYOUTS = 1000
+# UCT exploration constant
+EXPLORATION = 0.7
+
+class Node():
+    # A move in the search tree. wins counts the playouts won by the colour
+    # that played move, the colour whose turn it is at the parent
+    def __init__(self, move, parent, color, visits=0, wins=0.0):
+        self.move = move
+        self.parent = parent
+        self.color = color
+        self.children = None
+        self.visits = visits
+        self.wins = wins
+
+class MCTS():
+    def __init__(self, playouts=None, seconds=None, exploration=EXPLORATION,
+                 priors=True, prior_visits=10, prior_value=0.7, seed=None):
+        if playouts is None and seconds is None:
+            playouts = DEFAULT_PLAYOUTS
+        self.playouts = playouts
+        self.seconds = seconds
+        self.exploration = exploration
+        self.priors = priors
+        self.prior_visits = prior_visits
+        self.prior_value = prior_value
+        self.rng = random.Random(seed)
+        # Neighbour indices of every cell, per board size
+        self.neighbours = {}
+        # Playouts made by the last search
+        self.last_playouts = 0
+
+    def neighbour_indices(self, board_dimension):
+        neighbours = self.neighbours.get(board_dimension)
+        if neighbours is None:
+            n = board_dimension
+            neighbours = tuple(tuple(y*n + x for x, y in cells)
+                               for cells in geometry.get_geometry(n).neighbour_coords)
+            self.neighbours[board_dimension] = neighbours
+        return neighbours
+
+    def choose(self, board, color=patterns.BLACK):
+        # Returns the x,y of the move the search finds best for color
+        n = board.board_dimension
+        move = self.search(board, color)
+        return patterns.index_2_coord(move, n)
+
+    def search(self, board, color):
+        # Runs the search from the board's position with color to move and
+        # returns the index of the most visited move
+        n = board.board_dimension
+        cells = bytearray(n*n)
+        empty = []
+        for index in range(n*n):
+            bit = 1 << index
+            if board.black_bits & bit:
+                cells[index] = patterns.BLACK
+            elif board.white_bits & bit:
+                cells[index] = patterns.WHITE
+            else:
+                empty.append(index)
+        if not empty:
+            raise ValueError("no empty cells to search")
+        if len(empty) == 1:
+            return empty[0]
+
+        root = Node(None, None, other(color))
+        root.children = self.root_children(board, root, color, empty)
+        neighbours = self.neighbour_indices(n)
+        rng = self.rng
+
+        playouts = 0
+        deadline = None if self.seconds is None else time.perf_counter() + self.seconds
+        while True:
+            if self.playouts is not None and playouts >= self.playouts:
+                break
+            if deadline is not None and playouts and time.perf_counter() >= deadline:
+                break
+            self.iterate(root, cells, empty, color, neighbours, n, rng)
+            playouts += 1
+        self.last_playouts = playouts
+
+        best = max(root.children, key=lambda child: child.visits)
+        return best.move
+
+    def root_children(self, board, root, color, empty):
+        # Children of the root, the moves in black's substrategies get the
+        # prior visits when priors are on
+        pattern_cells = board.substrategies.cell_index if self.priors else {}
+        children = []
+        for move in empty:
+            if move in pattern_cells:
+                children.append(Node(move, root, color, self.prior_visits,
+                                     self.prior_visits * self.prior_value))
+            else:
+                children.append(Node(move, root, color))
+        self.rng.shuffle(children)
+        return children
+
+    def iterate(self, root, cells, empty, color, neighbours, n, rng):
+        # One selection, expansion, playout and backup
+        cells = bytearray(cells)
+        remaining = set(empty)
+        node = root
+        to_move = color
+        # Walk down while the nodes have been expanded
+        while node.children:
+            node = self.select(node)
+            cells[node.move] = node.color
+            remaining.discard(node.move)
+            to_move = other(node.color)
+        # Expand the leaf once it has been visited, one level per iteration
+        if node.visits > 0 and remaining:
+            node.children = [Node(move, node, to_move) for move in remaining]
+            rng.shuffle(node.children)
+            node = node.children[0]
+            cells[node.move] = node.color
+            remaining.discard(node.move)
+            to_move = other(node.color)
+        winner = playout(cells, list(remaining), to_move, neighbours, n, rng)
+        while node is not None:
+            node.visits += 1
+            if node.color == winner:
+                node.wins += 1
+            node = node.parent
+
+    def select(self, node):
+        # The child with the highest upper confidence bound, unvisited
+        # children first
+        log_visits = math.log(node.visits + 1)
+        exploration = self.exploration
+        best = None
+        best_value = -1.0
+        for child in node.children:
+            if child.visits == 0:
+                return child
+            value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best = child
+                best_value = value
+        return best
+
+def other(color):
+    return patterns.WHITE if color == patterns.BLACK else patterns.BLACK
+
+def playout(cells, remaining, to_move, neighbours, n, rng):
+    # Fills the empty cells at random, the colours taking turns starting with
+    # to_move, and returns the winner of the full board. cells is modified
+    rng.shuffle(remaining)
+    second = other(to_move)
+    for i, index in enumerate(remaining):
+        cells[index] = second if i & 1 else to_move
+    return winner_of_full_board(cells, neighbours, n)
+
+def winner_of_full_board(cells, neighbours, n):
+    # Black wins a full board if its stones connect the first and last row,
+    # otherwise white does
+    black = patterns.BLACK
+    stack = [index for index in range(n) if cells[index] == black]
+    seen = set(stack)
+    last_row = n*(n-1)
+    while stack:
+        index = stack.pop()
+        if index >= last_row:
+            return black
+        for neighbour in neighbours[index]:
+            if neighbour not in seen and cells[neighbour] == black:
+                seen.add(neighbour)
+                stack.append(neighbour)
+    return patterns.WHITE
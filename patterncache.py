@@ -0,0 +1,93 @@
+# Pattern match cache
+#
+# Matching the templates at a black stone only depends on the stones in the
+# cells those templates look at, its footprint (see templates.compile_templates).
+# The same local shapes come up again and again, every game from the same
+# opening starts with them, so the records found for a footprint are kept and
+# reused. A key is (board size, anchor, black stones in the footprint,
+# white stones in the footprint), the empty cells follow from the two masks.
+#
+# The cache is bounded. When it is full the least recently used entry is
+# dropped, or the oldest one with the 'fifo' policy, which skips the reordering
+# on every hit.
+#
+# A HexBoard only uses a cache once one is set as its pattern_cache, boards
+# can share default_cache or be given their own. With the current pattern
+# table a match is a handful of mask tests and the cache loses: rescanning
+# the positions of 150 8x8 self-play games with find_single_patterns and
+# find_adjacent_patterns takes about 1.7 times as long through
+# default_cache as without it, at a 64% hit rate. It is off by default and
+# only kept for pattern tables large enough that matching costs more than
+# building the key.
+#
+# Only find_single_patterns and find_adjacent_patterns consult the cache. The
+# engine's find_substrategies path reads the matches HexBoard keeps up to
+# date stone by stone and never looks in the cache.
+
+from collections import OrderedDict
+
+# Cache size used when none is given
+DEFAULT_SIZE = 4096
+
+class PatternCache():
+    def __init__(self, size=DEFAULT_SIZE, policy='lru'):
+        if policy not in ('lru', 'fifo'):
+            raise ValueError("policy must be 'lru' or 'fifo'")
+        self.size = size
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        # Returns the cached records for key, or None
+        records = self.entries.get(key)
+        if records is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == 'lru':
+            self.entries.move_to_end(key)
+        return records
+
+    def put(self, key, records):
+        # Stores the records for key, dropping the oldest entry when full
+        if self.size <= 0:
+            return
+        self.entries[key] = records
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, size):
+        # Changes the bound, dropping the oldest entries that no longer fit
+        self.size = size
+        while len(self.entries) > max(size, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        # Returns the counters as a dict
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size,
+            'policy': self.policy,
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+# A shared cache boards can opt into
+default_cache = PatternCache()
@@ -53,17 +53,22 @@
 #
 # CLEANUP:
 # 432 pattern (finding and replying)
-# Certain patterns checking empty cells inefficient
 #
 # ISSUES
 # 432 only represented in 4 cases
 # Stealing priority positions
 # Contracts don't really exist, finds all possible patterns even if some overlap which can cause problems
 #
-# Currently missing JY patterns 7,8
+# Currently missing JY patterns 7,8 (add them to PATTERN_TABLE in templates.py)
 
 import numpy as np
 import random
+from collections.abc import Mapping
+from typing import NamedTuple
+import coords
+import geometry
+# Coordinate conversions, see coords.py
+from coords import coord_2_pos, pos_2_coord
 # cell states
 UNOCCUPIED = 0
 BLACK = 1
@@ -73,110 +78,171 @@ WHITE = 2
 class HexBoard():
     # intialize board state to all cells unoccupied
     def __init__(self, board_dimension):
-        self.substrategies = []
         self.board_dimension = board_dimension
-        self.unoccupied = []
+        self.substrategies = StrategySet(board_dimension)
+        # Size dependent tables, shared read-only by every board of this size
+        self.geometry = geometry.get_geometry(board_dimension)
+        self.unoccupied = list(self.geometry.column_major_coords)
         self.move_list = []
+        # Cell indices of the stones in the order they were placed, see
+        # records.py
+        self.history = []
         # Create the 2D array to keep track of the board position
         self.board_array = np.zeros((self.board_dimension, self.board_dimension), int)
         self.priority_list = ['c5', 'd3']
-        # Populates a dictionary with an x,y key corresponding to a cell object
-        self.board_dict = {}
+        # Maps an x,y key to a cell object. The cells are made on demand and
+        # only read the bitboards below, so a board holds no per-cell objects
+        self.board_dict = CellView(self)
         
-        for x in range(self.board_dimension):
-            for y in range(self.board_dimension):
-                self.board_dict[(x,y)] = HexCell(x,y,self.board_dimension)
-                self.unoccupied.append((x,y))
+        # Bitboards, bit y*n + x is set when cell (x,y) holds that state. These
+        # are the real board state, board_dict and board_array follow them
+        cell_count = self.geometry.cell_count
+        self.full_mask = self.geometry.full_mask
+        self.black_bits = 0
+        self.white_bits = 0
+        self.empty_bits = self.full_mask
         
+        # Fixed masks for black's edges, single cells and the neighbours of
+        # every cell, indexed by y*n + x
+        self.black_edge_mask = self.geometry.black_edge_mask
+        self.cell_masks = self.geometry.cell_masks
+        self.neighbour_masks = self.geometry.neighbour_masks
+        
+        # Pattern templates compiled for this board size, and every template
+        # black currently has on the board as a Substrategy keyed by
+        # (group, anchor, position).
+        # matches is kept up to date by set_stone so a refresh of the
+        # substrategies never needs a full rescan
+        self.templates = self.geometry.templates
+        self.matches = {}
+        # Optional cache of the records find_single_patterns and
+        # find_adjacent_patterns find for each local shape, see patterncache.py
+        self.pattern_cache = None
+        # Optional move selector used instead of a random move when white
+        # doesn't threaten any substrategy, see mcts.py
+        self.mcts = None
+        # Optional position evaluator ranking the fallback moves when no
+        # search is set, see resistance.py
+        self.evaluator = None
+        # Optional opening book, consulted before the patterns, see book.py
+        self.book = None
+        # Optional solved table for small boards, consulted before the book,
+        # see tables.py
+        self.tables = None
+        # Optional virtual connection search, its connections are added to
+        # the substrategies with pattern id 18, see hsearch.py
+        self.hsearch = None
+        # Number of replies made with each pattern id, for statistics
+        self.reply_counts = {}
+        
+        # Disjoint-set forest used for win detection. Cells are indexed as
+        # y*n + x and the four edges get virtual nodes after the last cell, so
+        # a colour has won once its two edge nodes share a root
+        self.top_edge = cell_count
+        self.bottom_edge = cell_count + 1
+        self.left_edge = cell_count + 2
+        self.right_edge = cell_count + 3
+        self.parent = list(self.geometry.initial_parent)
+        self.set_size = [1] * (cell_count + 4)
+        
+        # Zobrist hash of the stones and the side to move, updated with every
+        # stone so equal positions can be found without comparing boards.
+        # Black moves first and the side to move is the opposite colour of
+        # the last stone played
+        self.to_move = BLACK
+        self.hash = 0
+        
+        # Moves played with play, each a frame of the changes it made so undo
+        # can take them back, and the undone frames redo can play again.
+        # frame is the one being written while a move is played
+        self.undo_stack = []
+        self.redo_stack = []
+        self.frame = None
+        
+    def cells_to_mask(self, cells):
+        # Converts a list of x,y coordinates into a single mask
+        mask = 0
+        for cell in cells:
+            mask |= self.cell_masks[cell]
+        return mask
+    
+    def get_state(self, x, y):
+        # Returns the state of the cell at x,y from the bitboards
+        bit = self.cell_masks[(x,y)]
+        if self.black_bits & bit:
+            return BLACK
+        elif self.white_bits & bit:
+            return WHITE
+        return UNOCCUPIED
+    
     def expand(self,pos1):
-        # Neighbour search, used for DFS to find a winning path
-        color = self.board_dict[pos1].get_state()
-        append_list = []
-        return_list = []
+        # Neighbour search, returns the neighbouring cells holding the same
+        # colour as pos1
+        color = self.get_state(pos1[0], pos1[1])
+        if color == BLACK:
+            same = self.black_bits
+        elif color == WHITE:
+            same = self.white_bits
+        else:
+            same = self.empty_bits
+        index = pos1[1]*self.board_dimension + pos1[0]
+        return [index_2_coord(nbr, self.board_dimension) for nbr in mask_indices(self.neighbour_masks[index] & same)]
+
+    def find_root(self, index):
+        # Finds the root of the set containing index. Paths aren't compressed,
+        # so a union only ever changes two entries and can be undone, union
+        # by size keeps the trees shallow instead
+        parent = self.parent
+        while parent[index] != index:
+            index = parent[index]
+        return index
+    
+    def union(self, index1, index2):
+        # Joins the sets containing index1 and index2, hanging the smaller set
+        # under the larger one
+        root1 = self.find_root(index1)
+        root2 = self.find_root(index2)
+        if root1 == root2:
+            return
+        if self.set_size[root1] < self.set_size[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.set_size[root1] += self.set_size[root2]
+        if self.frame is not None:
+            self.frame.append(('union', root1, root2))
         
-        # p_list contains the potential neighbouring cells with x,y relative to
-        # the current position
-        p_list = [(1,0),(0,1),(1,-1),(-1,1),(-1,0),(0,-1)]
-        for p in p_list:
-            # Find the new position (neighbour) and ensure it is within the
-            # bounds of the board. If it is, add it to append_list since it is
-            # a neighbour
-            new_pos = (pos1[0]+p[0],pos1[1]+p[1])
-            if new_pos[0] < self.board_dimension and new_pos[1] < self.board_dimension and new_pos[0] >= 0 and new_pos[1] >= 0:
-                append_list.append(new_pos)
-                
-        # For all the neighbouring cells, add the ones that contain the same
-        # colour cell as the original, then return those
-        for pos in append_list:
-            cell = self.board_dict[pos]
-            if cell.get_state() == color:
-                return_list.append(pos)
-                
-        return return_list
+    def join_stone(self, x, y, state):
+        # Adds a newly placed stone to the disjoint-set forest, joining it to
+        # any neighbouring stones of the same colour and to its edges
+        index = y*self.board_dimension + x
+        if state == BLACK:
+            if y == 0:
+                self.union(index, self.top_edge)
+            if y == self.board_dimension - 1:
+                self.union(index, self.bottom_edge)
+        elif state == WHITE:
+            if x == 0:
+                self.union(index, self.left_edge)
+            if x == self.board_dimension - 1:
+                self.union(index, self.right_edge)
+        
+        if state == BLACK:
+            same = self.black_bits
+        else:
+            same = self.white_bits
+        for nbr in mask_indices(self.neighbour_masks[index] & same):
+            self.union(index, nbr)
 
     # search for black wins
     def dfs_black(self):
-        # Performs a DFS looking for a black win. Goes top to bottom on the board
-        current_list = []
-        drop_list = []
-        
-        # Check all cells in the first row, any that are black get added to the
-        # current list
-        for i in range(self.board_dimension):
-            if self.board_dict[(i,0)].get_state() == 1:
-                current_list.append((i,0))
-                
-        # Iterate until the current list has no more cells
-        while current_list != []:
-            for pos in current_list:
-                # Add all neighbours with the same colour cell to the list
-                current_list.extend(self.expand(pos))
-                # Add the current cell to the list of cells we've already checked
-                drop_list.append(pos)
-                # Update the current list so it contains no cells that have 
-                # already been checked
-                current_list = list(set(current_list).difference(set(drop_list)))
-                for pos1 in current_list:
-                    # If any cell in the current list has reached the last row,
-                    # then a winning path has been found, so return true
-                    if pos1[1] == self.board_dimension - 1:
-                        return True
-            
-        # No winning path was found, return false
-        if len(current_list) == 0:
-            return False
-        
+        # Black wins when a chain of black stones joins the top and bottom rows,
+        # which is when both edge nodes are in the same set
+        return self.find_root(self.top_edge) == self.find_root(self.bottom_edge)
     
     def dfs_white(self):
-        # Performs a DFS looking for a white win. Goes left to right on the board
-        current_list = []
-        drop_list = []
-        
-        for i in range(self.board_dimension):
-            # For all the cells in the first column, if the cell contains a
-            # white stone, add it to the current list
-            if self.board_dict[(0,i)].get_state() == 2:
-                current_list.append((0,i))
-                
-        # Iterate until the current list has no more cells left
-        while current_list != []:
-            for pos in current_list:
-                # Find other positions connecting to the current cell with the
-                # same colour
-                current_list.extend(self.expand(pos))
-                # Add current position to drop list to show it has been checked
-                drop_list.append(pos)
-                # Remove already checked cells from the current list
-                current_list = list(set(current_list).difference(set(drop_list)))
-                for pos1 in current_list:
-                    if pos1[0] == self.board_dimension - 1:
-                        # Have reached the end of the board with a path, so
-                        # white has a winning path
-                        return True
-        
-        # All items in the current list have been checked, no win exists for white
-        if len(current_list) == 0:
-            return False
+        # White wins when a chain of white stones joins the first and last
+        # columns
+        return self.find_root(self.left_edge) == self.find_root(self.right_edge)
         
     def detect_win(self):
         # Returns a 1 if black has won, a 2 if white has won, or a 0 if no one
@@ -190,63 +256,278 @@ class HexBoard():
         
     def __repr__(self):
         # Returns a string representation of the board
-        board = " a b c d e f g h\n"
+        board = coords.column_header(self.board_dimension) + "\n"
         for row in range(self.board_dimension):
-            board += (' '*row) + str(row+1)
+            # Two digit row numbers take one more space, indent them one less
+            # so the cells stay lined up
+            board += (' '*(row - len(str(row+1)) + 1)) + str(row+1)
             for col in self.board_array[row]:
                 board += ' ' + str(col)
             board += '\n'
         return board
     
+    def set_stone(self, x, y, state):
+        # Puts a stone on an empty cell and updates every structure that
+        # tracks the board state
+        bit = self.cell_masks[(x,y)]
+        if self.frame is not None:
+            position = self.unoccupied.index((x,y)) if (x,y) in self.unoccupied else None
+            self.frame.append(('stone', x, y, state, self.hash, self.to_move, position))
+        self.empty_bits &= ~bit
+        if state == BLACK:
+            self.black_bits |= bit
+        else:
+            self.white_bits |= bit
+        self.board_array[y][x] = state
+        index = y*self.board_dimension + x
+        if state == BLACK:
+            self.hash ^= self.geometry.black_keys[index]
+            next_to_move = WHITE
+        else:
+            self.hash ^= self.geometry.white_keys[index]
+            next_to_move = BLACK
+        if next_to_move != self.to_move:
+            self.hash ^= self.geometry.white_to_move_key
+            self.to_move = next_to_move
+        self.history.append(index)
+        self.join_stone(x, y, state)
+        self.update_matches(index)
+        if self.hsearch is not None:
+            self.hsearch.play(index, state)
+        
+        if (x,y) in self.unoccupied:
+            self.unoccupied.remove((x,y))
+    
     def place_stone(self, x, y, state):
         # Places a stone with the given colour at a specific cell
-        cell = self.board_dict[(x,y)]
-        
         # Check the cell is valid to play in, if not return
-        if cell.get_state() == UNOCCUPIED:                
+        if self.empty_bits & self.cell_masks[(x,y)]:
             # Place a stone at the given x,y coordinate
-            cell.set_state(state)
-            self.board_array[y][x] = state
+            self.set_stone(x, y, state)
         else:
             print("Cell occupied, choose another cell")
             return
         
+        if state == BLACK:
+            # Black's stone breaks any pattern it was played in. A white stone
+            # is only removed from the patterns once black has replied to it
+            self.discard_strategies(x, y)
+        
         #for pairs in self.find_432():
             #for move in pairs:
                 #if move not in self.move_list:
                     #self.move_list.append(move)
             
-        if (x,y) in self.unoccupied:
-            self.unoccupied.remove((x,y))
-            
         if state == WHITE:
-            x,y = self.search_strategies(x,y)
+            if self.detect_win() != 0:
+                # White's move ended the game, there is nothing to reply to
+                return
+            white_x, white_y = x, y
+            try:
+                x,y = self.search_strategies(x,y)
+            except ValueError:
+                # A randomly chosen strategy that white didn't play in may
+                # have no reply, it is left in place and black plays the
+                # fallback move instead
+                x,y = self.fallback_move()
+            # Remove any patterns white played in
+            self.discard_strategies(white_x, white_y)
             try:
                 self.place_stone(x,y,BLACK)
-                # Remove any patterns that no longer exist
-                self.substrategies = [pattern for pattern in self.substrategies if self.check_all_empty(self.change_pattern(pattern[0:len(pattern)-1]))]
                 if len(self.substrategies) == 0:
                     self.find_substrategies()                
             except:
-                coord = random.choice(self.unoccupied)
-                x = coord[0]
-                y = coord[1]
+                x,y = self.fallback_move()
                 self.place_stone(x,y,BLACK)
                     
+    def play(self, x, y, state):
+        # Plays a move like place_stone, black's reply included, and records
+        # it so undo can take it back. Returns False if the cell was taken
+        frame = []
+        self.frame = frame
+        self.substrategies.journal = frame
+        if self.hsearch is not None:
+            records = self.hsearch.copy_records()
+        try:
+            self.place_stone(x, y, state)
+        finally:
+            self.frame = None
+            self.substrategies.journal = None
+        if not frame:
+            return False
+        if self.hsearch is not None:
+            # The records the pattern 18 substrategies reply with, before
+            # and after the move, for undo and redo to restore
+            frame.append(('records', records, self.hsearch.copy_records()))
+        self.undo_stack.append(frame)
+        self.redo_stack = []
+        return True
+    
+    def undo(self):
+        # Takes back the last move made with play, returns False if there is
+        # none. Only the cells and structures the move changed are touched
+        if not self.undo_stack:
+            return False
+        frame = self.undo_stack.pop()
+        for entry in reversed(frame):
+            kind = entry[0]
+            if kind == 'stone':
+                kind, x, y, state, old_hash, old_to_move, position = entry
+                bit = self.cell_masks[(x,y)]
+                self.black_bits &= ~bit
+                self.white_bits &= ~bit
+                self.empty_bits |= bit
+                self.board_array[y][x] = UNOCCUPIED
+                self.hash = old_hash
+                self.to_move = old_to_move
+                if position is not None:
+                    self.unoccupied.insert(position, (x,y))
+                self.history.pop()
+                self.update_matches(y*self.board_dimension + x)
+            elif kind == 'union':
+                kind, root1, root2 = entry
+                self.parent[root2] = root2
+                self.set_size[root1] -= self.set_size[root2]
+            elif kind == 'add':
+                self.substrategies.delete(entry[1])
+            elif kind == 'remove':
+                self.substrategies.insert(entry[1], entry[2])
+            elif kind == 'strategies':
+                self.substrategies = entry[1]
+        if self.hsearch is not None:
+            # The connections aren't journaled, they are rebuilt instead.
+            # The rebuild clears the records, the ones from before the move
+            # are put back so the restored substrategies can be replied to
+            self.hsearch.compute(self.black_bits, self.white_bits)
+            for entry in frame:
+                if entry[0] == 'records':
+                    self.hsearch.records = self.hsearch.copy_records(entry[1])
+        self.redo_stack.append(frame)
+        return True
+    
+    def redo(self):
+        # Plays the last undone move again, exactly as it was played, returns
+        # False if there is none
+        if not self.redo_stack:
+            return False
+        frame = []
+        self.frame = frame
+        self.substrategies.journal = frame
+        try:
+            for entry in self.redo_stack.pop():
+                kind = entry[0]
+                if kind == 'stone':
+                    self.set_stone(entry[1], entry[2], entry[3])
+                elif kind == 'add':
+                    self.substrategies.append(entry[1], entry[2])
+                elif kind == 'remove':
+                    self.substrategies.remove(entry[1])
+                elif kind == 'strategies':
+                    self.substrategies.journal = None
+                    self.substrategies = entry[2]
+                    self.substrategies.journal = frame
+                    frame.append(entry)
+                elif kind == 'records':
+                    self.hsearch.records = self.hsearch.copy_records(entry[2])
+                    frame.append(entry)
+        finally:
+            self.frame = None
+            self.substrategies.journal = None
+        self.undo_stack.append(frame)
+        return True
+    
+    def clone(self):
+        # Returns an independent copy of the board. The size dependent tables
+        # are shared and everything else is a flat copy, the undo history is
+        # not copied
+        board = HexBoard.__new__(HexBoard)
+        board.__dict__.update(self.__dict__)
+        board.substrategies = self.substrategies.copy()
+        board.unoccupied = list(self.unoccupied)
+        board.move_list = list(self.move_list)
+        board.history = list(self.history)
+        board.board_array = self.board_array.copy()
+        board.priority_list = list(self.priority_list)
+        board.board_dict = CellView(board)
+        board.matches = dict(self.matches)
+        board.reply_counts = dict(self.reply_counts)
+        board.parent = list(self.parent)
+        board.set_size = list(self.set_size)
+        board.undo_stack = []
+        board.redo_stack = []
+        board.frame = None
+        if self.hsearch is not None:
+            board.hsearch = self.hsearch.copy()
+        return board
+    
     def find_substrategies(self):
-        # Finds the sub-patterns within the board
-        singles = self.find_single_patterns()
-        adjacents = self.find_adjacent_patterns()
-        self.substrategies = singles + adjacents
+        # Finds the sub-patterns within the board. The matches are maintained
+        # as stones get placed, so this gives the same patterns as calling
+        # find_single_patterns and find_adjacent_patterns
+        old = self.substrategies
+        strategies = list(self.matches.values())
+        if self.hsearch is not None:
+            strategies += self.hsearch.substrategies()
+        self.substrategies = StrategySet(self.board_dimension, strategies)
+        if self.frame is not None:
+            old.journal = None
+            self.substrategies.journal = self.frame
+            self.frame.append(('strategies', old, self.substrategies))
+    
+    def discard_strategies(self, x, y):
+        # Removes the substrategies that use the cell at x,y. Every cell of a
+        # live substrategy is empty, so these are the only ones a stone there
+        # can break
+        self.substrategies.discard_cell(y*self.board_dimension + x)
+    
+    def update_matches(self, index):
+        # Re-matches the black templates that depend on the cell at index,
+        # adding the ones that now exist and dropping the ones that no longer do
+        own = self.black_bits
+        other = self.white_bits
+        empty = self.empty_bits
+        connected = None
+        
+        for key in self.templates['dependents'][index]:
+            group, anchor, position = key
+            if not own >> anchor & 1:
+                # Templates are anchored on a black stone
+                if key in self.matches:
+                    del self.matches[key]
+                continue
+            
+            pattern_id, cells, cells_mask, black_mask, any_mask, white_mask, connect_mask = self.templates[group][anchor][position]
+            found = (cells_mask & empty == cells_mask and black_mask & own == black_mask
+                     and white_mask & other == white_mask and (not any_mask or any_mask & own))
+            if found and connect_mask:
+                if connected is None:
+                    connected = self.black_edge_mask | self.geometry.up_down_neighbours_of(own)
+                found = not connect_mask & ~connected
+            
+            if not found:
+                if key in self.matches:
+                    del self.matches[key]
+            elif key not in self.matches:
+                self.matches[key] = Substrategy(pattern_id, cells)
+    
+    def threatened_strategies(self, x, y):
+        # Returns every substrategy that uses the cell at x,y, oldest first
+        return self.substrategies.containing(y*self.board_dimension + x)
     
     def search_strategies(self, x,y):
-        white_move = coord_2_pos(x,y)
+        move = self.book_move()
+        if move is not None:
+            return move
+        white_move = y*self.board_dimension + x
         # Find the strategy (if it exists) that white played in, then make a
         # replying move in that substrategy
-        for strat in self.substrategies:
-            if white_move in strat:
-                return self.get_move(strat, white_move)
+        threatened = self.substrategies.containing(white_move)
+        if threatened:
+            return self.get_move(threatened[0], white_move)
                 
+        if self.mcts is not None or self.evaluator is not None:
+            return self.fallback_move()
+        
         #if self.priority_list != [] and white_move not in self.priority_list:
             #move = self.priority_list.pop()
             #coord = pos_2_coord(move)
@@ -267,10 +548,31 @@ class HexBoard():
         
         return x,y
     
+    def book_move(self):
+        # The solved table's or else the opening book's move for the side to
+        # move as x,y, or None when neither is set or has the position
+        for source in (self.tables, self.book):
+            if source is not None:
+                move = source.lookup(self)
+                if move is not None:
+                    return move
+        return None
+    
+    def fallback_move(self):
+        # Black's move when the patterns give none, from the search in mcts
+        # or the best move by the evaluator if one is set, otherwise a random
+        # empty cell
+        if self.mcts is not None:
+            return self.mcts.choose(self, BLACK)
+        if self.evaluator is not None:
+            return self.evaluator.choose(self, BLACK)
+        return random.choice(self.unoccupied)
+    
     def get_move(self, strat, white_move):
-        # Find the pattern white is threatening and reply
-        # If there's time this function should be optimized
-        pattern_id = strat[len(strat)-1]
+        # Find the pattern white is threatening and reply. white_move is the
+        # index of white's cell, the reply is returned as x,y
+        pattern_id = strat.pattern_id
+        self.reply_counts[pattern_id] = self.reply_counts.get(pattern_id, 0) + 1
         # If only python had switch statements...
         if pattern_id == 2: # Bridge is pattern 2
             move = self.reply_bridge(strat, white_move)
@@ -296,6 +598,8 @@ class HexBoard():
             move = self.reply_pattern16(strat, white_move)
         elif pattern_id == 17:
             move = self.reply_pattern17(strat, white_move)
+        elif pattern_id == 18: # Virtual connection found by hsearch.py
+            move = self.reply_hsearch(strat, white_move)
         else:
             # Other options are all split options with a triangle,
             # only need to call the one function
@@ -310,728 +614,593 @@ class HexBoard():
         # Only decomposes patterns that use a general reply strategy, all others
         # get decomposed in their replying strategy
         if type(move) == tuple:
-            move = coord_2_pos(move[0], move[1])
+            move = move[1]*self.board_dimension + move[0]
             
         # Remove the substrategy as it no longer exists
         self.substrategies.remove(pattern)
-        index = pattern.index(move) # Get the index of the move
+        cells = pattern.cells
+        index = cells.index(move) # Get the index of the move
         if pattern_id == 3 or pattern_id == 6:
             # Double triangle, one bridge gets formed
             if index == 0:
-                self.substrategies.append(pattern[1:3] + [2])
+                self.substrategies.append(Substrategy(2, cells[1:3]))
             else:
-                self.substrategies.append(pattern[4:6] + [2])
+                self.substrategies.append(Substrategy(2, cells[4:6]))
                 
         elif pattern_id == 4 or pattern_id == 5: # 432 pattern should be implemented here as well
             if index == 0:
-                self.substrategies.append(pattern[1:3] + [2])
+                self.substrategies.append(Substrategy(2, cells[1:3]))
             else:
-                self.substrategies.append(pattern[4:6] + [2])
-                self.substrategies.append(pattern[6:8] + [2])
+                self.substrategies.append(Substrategy(2, cells[4:6]))
+                self.substrategies.append(Substrategy(2, cells[6:8]))
                 
         elif pattern_id == 7:
             if index == 0:
-                self.substrategies.append(pattern[1:3] + [2])
+                self.substrategies.append(Substrategy(2, cells[1:3]))
             else:
-                self.substrategies.append(pattern[4:6] + [2])
+                self.substrategies.append(Substrategy(2, cells[4:6]))
                 # Way of adding this pattern WILL need to be changed upon redoing 432 pattern
-                self.substrategies.append(pattern[6:14] + [5])
+                self.substrategies.append(Substrategy(5, cells[6:14]))
                 
         elif pattern_id == 9:
             if index == 0:
-                self.substrategies.append(pattern[1:3] + [2])
-                self.substrategies.append(pattern[3:5] + [2])
+                self.substrategies.append(Substrategy(2, cells[1:3]))
+                self.substrategies.append(Substrategy(2, cells[3:5]))
             else:
-                self.substrategies.append(pattern[6:8] + [2])
-                self.substrategies.append(pattern[8:10] + [2])
+                self.substrategies.append(Substrategy(2, cells[6:8]))
+                self.substrategies.append(Substrategy(2, cells[8:10]))
         return
     
     def find_single_patterns(self):
         # Finds all patterns that only require a single cell being black
         # coloured to work
         return_list = []
-        for pos in self.board_dict:
-            if self.board_dict[pos].get_state() == BLACK:
-                # For all black coloured cells check if they make a known pattern
-                return_list = self.find_bridge(1, pos, return_list)
-                return_list = self.find_432(pos, return_list)
-                return_list = self.find_jyp9(pos, return_list)
-        
-        return return_list
-    
-    def find_bridge(self, color, pos, return_list=[]):
-        cell = self.board_dict[pos]
-        # Find the bridges associated with that cell
-        cell_bridges = cell.get_bridges()
-        for cell_bridge in cell_bridges:
-            # Get the other cell that gets bridged to
-            cell_bridge = self.board_dict[cell_bridge]
-            if cell_bridge.get_state() == color:
-                # If the bridge cell is also the color we are looking for
-                # and the cells between them are empty, add the cells
-                # to the return list
-                pairs = list(set(cell.get_neighbours()) & set(cell_bridge.get_neighbours()))
-                if self.board_dict[pairs[0]].get_state() == UNOCCUPIED and self.board_dict[pairs[1]].get_state() == UNOCCUPIED:
-                    return_list.append([coord_2_pos(pairs[0][0],pairs[0][1]),coord_2_pos(pairs[1][0],pairs[1][1])] + [2])
-        
-        # Find bridges that are edge bridges
-        cell_nbrs = cell.get_neighbours()
-        for nbr in cell_nbrs:
-            if self.board_dict[nbr].get_state() == UNOCCUPIED:
-                # Get the shared cells of the neighbour and cell
-                bridge_cell = set(cell.get_neighbours()) & set(self.board_dict[nbr].get_neighbours())
-                # Iterate through the shared cells
-                for overlap_cell in bridge_cell:
-                    if self.board_dict[overlap_cell].get_state() == UNOCCUPIED:
-                        # If both cells are unoccupied and black edges, then a bridge exists between them
-                        if self.board_dict[overlap_cell].is_black_edge() and self.board_dict[nbr].is_black_edge():
-                            return_list.append([coord_2_pos(nbr[0],nbr[1]),coord_2_pos(overlap_cell[0],overlap_cell[1])] + [2])
-                                    
-        return return_list
-    
-    def find_432(self, pos, return_list):
-        # Finds open 432 pattern positions and adds them to the return_list
-        potential_patterns = self.board_dict[pos].get_432()
+        for index in mask_indices(self.black_bits):
+            # For all black coloured cells check if they make a known pattern
+            if self.pattern_cache is None:
+                return_list = self.match_templates(index, 'bridge', BLACK, return_list)
+                return_list = self.match_templates(index, 'single', BLACK, return_list)
+            else:
+                return_list.extend(self.cached_matches(index)[0])
         
-        for pattern in potential_patterns:
-            cells_to_check = pattern[1:3] + pattern[6::]
-            # Pattern must be fully empty and connected to exist
-            if self.check_all_empty(pattern) and self.connected_ud_pattern(cells_to_check):
-                pattern = self.change_pattern(list(pattern)) + [5]
-                if pattern not in return_list:
-                    return_list.append(pattern)
-                    
         return return_list
     
     def find_adjacent_patterns(self):
         # Finds patterns that require two adjacent black coloured cells
+        # Patterns with "jyp#" stands for Jing Yang Pattern #, see templates.py
         return_list = []
-        for pos in self.board_dict:
-            if self.board_dict[pos].get_state() != BLACK:
-                continue
-            
-            x = pos[0]
-            y = pos[1]
-            # An adjacent cell must be black to have this pattern work
-            adjacents = [(x-1,y), (x+1,y)]
-            for coord in adjacents:
-                # Check the coordinate exists in the board
-                if coord[0] >= 0 and coord[0] < self.board_dimension:
-                    if self.board_dict[coord].get_state() == BLACK:
-                        # Two adjacent black cells exist
-                        # Patterns with "jyp#" stands for Jing Yang Pattern # 
-                        return_list = self.find_double_triangle(pos, coord, return_list)
-                        return_list = self.find_jyp3(pos, return_list)
-                        return_list = self.find_jyp4(pos, return_list)
-                        
-            # Next set of adjacents for patterns
-            adjacents = [(x+1,y-1), (x-1,y+1), (x,y-1), (x,y+1)]
-            for coord in adjacents:
-                # Check coordinate exists on the board
-                if coord[0] >= 0 and coord[0] < self.board_dimension and coord[1] >= 0 and coord[1] < self.board_dimension:
-                    if self.board_dict[coord].get_state() == BLACK:
-                        # Adjacent black cells exist here, check corresponding patterns
-                        case = adjacents.index(coord)//2
-                        return_list = self.find_pattern7(pos, return_list, case)
-                        return_list = self.find_pattern8(pos, return_list, case)
-                        return_list = self.find_pattern12(pos, return_list, case)
+        for index in mask_indices(self.black_bits):
+            if self.pattern_cache is None:
+                return_list = self.match_templates(index, 'adjacent', BLACK, return_list)
+            else:
+                return_list.extend(self.cached_matches(index)[1])
                         
         return return_list
     
-    def find_jyp3(self, pos, return_list):
-        # Finds the 3rd Jing Yang pattern
-        potential_patterns = []
-        # We'll choose to position based on the first given black cell
-        x = pos[0]
-        y = pos[1]
-        if x >= 2 and y < self.board_dimension-2 and self.board_dict[(x, y+1)].get_state() == WHITE:
-            # Pattern having a white stone here means could have a down pattern
-            pattern = [(x-1,y+1), (x-2,y+2), (x-1,y+2), (x+1,y+1), (x,y+2), (x+1,y+2)]
-            if self.check_all_empty(pattern):
-                potential_patterns.append(pattern + [3])
-        
-        if x < self.board_dimension-2 and y > 1 and self.board_dict[(x+1, y-1)].get_state() == WHITE:
-            # Pattern having a white stone here means could have an up pattern
-            pattern = [(x,y-1), (x,y-2), (x+1,y-2), (x+2,y-1), (x+2,y-2), (x+3,y-2)]
-            if self.check_all_empty(pattern):
-                potential_patterns.append(pattern + [3])
-        
-        # Now need to check all the potential patterns are connected
-        for pattern in potential_patterns:
-            if self.connected_ud_pattern(pattern):
-                pattern = self.change_pattern(pattern[0:len(pattern)-1]) + [pattern[len(pattern)-1]]
-                if pattern not in return_list:
-                    return_list.append(pattern)
-        
-        return return_list
-    
-    def find_jyp4(self, pos, return_list):
-        # Finds the 4th Jing Yang pattern
-        potential_patterns = []
-        
-        x = pos[0]
-        y = pos[1]
-        if x > 0 and x < self.board_dimension-2 and y < self.board_dimension-2 and \
-           self.board_dict[(x,y+2)].get_state() == WHITE:
-            # Need these conditions for the down-right version of this pattern
-            potential_patterns.append([(x-1,y+2), (x-1,y+1), (x,y+1), (x+2,y+1), (x+2,y), (x+1,y+1), (x+1,y+2), (x+2,y+2)])
-        
-        if x > 2 and x < self.board_dimension-1 and y < self.board_dimension-2 and \
-             self.board_dict[(x-1,y+2)].get_state() == WHITE:
-            # Need these conditions for the down-left version of this pattern
-            potential_patterns.append([(x,y+2), (x+1,y+1), (x,y+1), (x-2,y+1), (x-1,y), (x-1,y+1), (x-3,y+2), (x-2,y+2)])
-                
-        if x > 0 and x < self.board_dimension-2 and y > 1 and self.board_dict[(x+1,y-2)].get_state() == WHITE:
-            # Need these conditions for the up-left version of this pattern
-            potential_patterns.append([(x+2,y-2), (x+2,y-1), (x+1,y-1), (x-1,y-1), (x-1,y), (x,y-1), (x,y-2), (x-1,y-2)])
-                
-        if x < self.board_dimension-4 and y > 1 and self.board_dict[(x+2,y-2)].get_state() == WHITE:
-            # Need these conditions for the up-right version of this pattern
-            potential_patterns.append([(x+1,y-2), (x,y-1), (x+1,y-1), (x+3,y-1), (x+2,y), (x+2,y-1), (x+3,y-2), (x+4,y-2)])
-        
-        # Any potential patterns that are fully connected up/down depending on
-        # the pattern get added to the return list
-        for pattern in potential_patterns:
-            cells_to_be_checked = [pattern[0]] + pattern[6::]
-            # Check cells are empty and connected
-            if self.check_all_empty(pattern) and self.connected_ud_pattern(cells_to_be_checked):
-                pattern = self.change_pattern(pattern) + [4]
-                if pattern not in return_list:
-                    return_list.append(pattern)
-            
-        return return_list
-    
-    def find_double_triangle(self, pos1, pos2, return_list):
-        # Finds 6 open spots by 2 adjacent black coloured cells
-        # pos and coord are the 2 adjacent cells that are black coloured
-        potential_patterns = []
-
-        # Find the minimum x position to begin generating patterns
-        if pos1[0] < pos2[0]:
-            min_x_pos = pos1
-        else:
-            min_x_pos = pos2
-            
-        x = min_x_pos[0]
-        y = min_x_pos[1]
-        if x > 0 and y < self.board_dimension-2:
-            # Can have a down six pattern
-            pattern = [(x-1,y+2), (x-1,y+1), (x,y+1), (x+1,y+1), (x,y+2), (x+1,y+2)]
-            empty = self.check_all_empty(pattern)
-            if empty:
-                potential_patterns.append(pattern + [6])
-                
-        if x + 1 < self.board_dimension-1 and y > 1:
-            # Can have an up six pattern
-            pattern = [(x+2,y-2), (x+2,y-1), (x+1,y-1), (x,y-1), (x+1,y-2), (x,y-2)]
-            empty = self.check_all_empty(pattern)
-            if empty:
-                potential_patterns.append(pattern + [6])
-                                
-        # Lastly need to check the potential sixes connect two sides
-        for pattern in potential_patterns:
-            if self.connected_ud_pattern(pattern):
-                pattern = self.change_pattern(pattern[0:len(pattern)-1]) + [pattern[len(pattern)-1]]
-                if pattern not in return_list:
-                    return_list.append(pattern)
-        
-        return return_list
+    def cached_matches(self, index):
+        # Returns the black templates anchored at index as two tuples, the
+        # bridges and singles and the adjacent patterns. They come from the
+        # pattern cache when the stones around index have been seen before
+        footprint = self.templates['footprints'][index]
+        key = (self.board_dimension, index, self.black_bits & footprint, self.white_bits & footprint)
+        records = self.pattern_cache.get(key)
+        if records is None:
+            singles = self.match_templates(index, 'bridge', BLACK, [])
+            records = (tuple(self.match_templates(index, 'single', BLACK, singles)),
+                       tuple(self.match_templates(index, 'adjacent', BLACK, [])))
+            self.pattern_cache.put(key, records)
+        return records
     
-    def find_pattern7(self, pos, return_list, case):
-        # Finds "Local Pattern 5" in the Hayward document (see comments at start
-        # for link). Use number 7 since 5 is already 432 pattern
-        # Case determines the way the adjacent cells are
-        potential_patterns = []
-        x = pos[0]
-        y = pos[1]
-        
-        if case == 0:
-            if x > 2 and x < self.board_dimension-2 and y < self.board_dimension-3 and \
-               self.board_dict[(x-1,y+2)].get_state() == WHITE:
-                # Need these conditions to form a down-right 7 pattern
-                potential_patterns.append([(x-2,y+2), (x-3,y+3), (x-2,y+3), (x+1,y+1), (x+1,y),\
-                                           (x,y+1), (x,y+2), (x-1,y+3), (x,y+3), (x+2,y+2),\
-                                           (x+2,y+1), (x+1,y+2), (x+1,y+3), (x+2,y+3)])
-                
-            if x > 1 and x < self.board_dimension-3 and y > 2 and self.board_dict[(x+1,y-2)].get_state() == WHITE:
-                # Need these conditions to form an up-left 7 pattern
-                potential_patterns.append([(x+2,y-2), (x+3,y-3), (x+2,y-3), (x-1,y-1), (x-1,y),\
-                                           (x,y-1), (x,y-2), (x+1,y-3), (x,y-3), (x-2,y-2),\
-                                           (x-2,y-1), (x-1,y-2), (x-1,y-3), (x-2,y-3)])
-                
-        else:
-            if x < self.board_dimension-5 and y > 2 and self.board_dict[(x+1,y-2)].get_state() == WHITE:
-                # Need these conditions to form an up-right 7 pattern
-                potential_patterns.append([(x,y-2), (x,y-3), (x+1,y-3), (x+2,y-1), (x+1,y),\
-                                           (x+1,y-1), (x+2,y-2), (x+2,y-3), (x+3,y-3), (x+4,y-2),\
-                                           (x+3,y-1), (x+3,y-2), (x+4,y-3), (x+5,y-3)])
-                
-            if x > 4 and y < self.board_dimension-3 and self.board_dict[(x-1,y+2)].get_state() == WHITE:
-                # Need these conditions to form a down-left 7 pattern
-                potential_patterns.append([(x,y+2), (x,y+3), (x-1,y+3), (x-2,y+1), (x-1,y),\
-                                           (x-1,y+1), (x-2,y+2), (x-2,y+3), (x-3,y+3), (x-4,y+2),\
-                                           (x-3,y+1), (x-3,y+2), (x-4,y+3), (x-5,y+3)])
-            
-        # Now need to check each potential pattern is empty and connects as expected
-        for pattern in potential_patterns:
-            cells_to_check = pattern[1:3] + pattern[7:9] + pattern[12::]
-            if self.check_all_empty(pattern) and self.connected_ud_pattern(cells_to_check):
-                pattern = self.change_pattern(pattern) + [7]
-                if pattern not in return_list:
-                    return_list.append(pattern)
-        
-        return return_list
+    def find_bridge(self, color, pos, return_list=None):
+        # Finds the bridges and edge bridges of the stone at pos
+        if return_list is None:
+            return_list = []
+        index = pos[1]*self.board_dimension + pos[0]
+        return self.match_templates(index, 'bridge', color, return_list)
     
-    def find_pattern8(self, pos, return_list, case):
-        # Finds "Local Pattern 4" in the Hayward document (see comments at start
-        # for link). Use number 8 since 4 is already a pattern
-        potential_patterns = []
-        x = pos[0]
-        y = pos[1]
-        
-        if case == 0:
-            if x > 1 and x < self.board_dimension-2 and y < self.board_dimension-3 and \
-               self.board_dict[(x-2,y+2)].get_state() == WHITE:
-                # Can have a down-right 8 pattern
-                potential_patterns.append([(x+1,y), (x,y+1), (x+1,y+1), (x+2,y+1), (x-1,y+2),\
-                                           (x,y+2), (x+1,y+2), (x+2,y+2), (x-2,y+3),\
-                                           (x-1,y+3), (x,y+3), (x+1,y+3), (x+2,y+3)])
-            
-            if x > 1 and x < self.board_dimension-2 and y > 2 and self.board_dict[(x+2,y-2)].get_state() == WHITE:
-                # Can have an up-left 8 pattern
-                potential_patterns.append([(x-1,y), (x,y-1), (x-1,y-1), (x-2,y-1), (x+1,y-2),\
-                                           (x,y-2), (x-1,y-2), (x-2,y-2), (x+2,y-3),\
-                                           (x+1,y-3), (x,y-3), (x-1,y-3), (x-2,y-3)])
+    def match_templates(self, index, group, color, return_list):
+        # Checks every compiled template of the group anchored at index and adds
+        # the ones that exist on the board to return_list
+        if color == BLACK:
+            own = self.black_bits
+            other = self.white_bits
         else:
-            if x > 4 and y < self.board_dimension-3 and self.board_dict[(x,y+2)].get_state() == WHITE:
-                # Need these conditions for a down-left 8 pattern
-                potential_patterns.append([(x-1,y), (x-1,y+1), (x-2,y+1), (x-3,y+1), (x-1,y+2),\
-                                           (x-2,y+2), (x-3,y+2), (x-4,y+2), (x-1,y+3),\
-                                           (x-2,y+3), (x-3,y+3), (x-4,y+3), (x-5,y+3)])
-                
-            if x < self.board_dimension-5 and y > 2 and self.board_dict[(x,y-2)].get_state() == WHITE:
-                # Need these conditions for an up-right 8 pattern
-                potential_patterns.append([(x+1,y), (x+1,y-1), (x+2,y-1), (x+3,y-1), (x+1,y-2),\
-                                           (x+2,y-2), (x+3,y-2), (x+4,y-2), (x+1,y-3),\
-                                           (x+2,y-3), (x+3,y-3), (x+4,y-3), (x+5,y-3)])
-            
-        # Check each pattern to see if it is empty and connected
-        for pattern in potential_patterns:
-            cells_to_check = pattern[8::]
-            if self.check_all_empty(pattern) and self.connected_ud_pattern(cells_to_check):
-                pattern = self.change_pattern(pattern) + [8]
-                if pattern not in return_list:
-                    return_list.append(pattern)
+            own = self.white_bits
+            other = self.black_bits
+        empty = self.empty_bits
+        connected = None
         
-        return return_list
-    
-    def find_jyp9(self, pos, return_list):
-        # Finds the 9th Jing Yang pattern
-        potential_patterns = []
-        
-        x = pos[0]
-        y = pos[1]
-        if x > 2 and x < self.board_dimension-1 and y < self.board_dimension-2 and \
-           self.board_dict[(x-1,y+2)].get_state() == WHITE:
-            # Need these conditions to form a down 9 pattern
-            potential_patterns.append([(x-2,y+1), (x-1,y), (x-1,y+1), (x-3,y+2), (x-2,y+2),\
-                                       (x+1,y+1), (x+1,y), (x,y+1), (x,y+2), (x+1,y+2)])
-            
-        if x > 0 and x < self.board_dimension-3 and y > 1 and self.board_dict[(x+1,y-2)].get_state() == WHITE:
-            # Need these conditions to form an up 9 pattern
-            potential_patterns.append([(x-1,y-1), (x-1,y), (x,y-1), (x,y-2), (x-1,y-2),\
-                                       (x+2,y-1), (x+1,y), (x+1,y-1), (x+2,y-2), (x+3,y-2)])
-            
-        # Check that each pattern only has empty cells and is connected
-        for pattern in potential_patterns:
-            # Cells to be checked to ensure the pattern connects
-            cells_to_check = pattern[3:5] + pattern[8::]
-            if self.check_all_empty(pattern) and self.connected_ud_pattern(cells_to_check):
-                pattern = self.change_pattern(pattern) + [9]
-                if pattern not in return_list:
-                    return_list.append(pattern)
-        
-        return return_list
-    
-    def find_pattern12(self, pos, return_list, case):
-        # Finds the 12th pattern on the game board. Pattern 12 is Local Pattern 7
-        # in the Hayward document
-        potential_patterns = []
-        x = pos[0]
-        y = pos[1]
-        
-        if case == 0:
-            if x > 3 and x < self.board_dimension-1 and y < self.board_dimension-4:
-                # Can have a down-right pattern
-                potential_patterns.append([(x+1,y), (x,y+1), (x+1,y+1), (x-2,y+2), (x-1,y+2),\
-                                           (x,y+2), (x+1,y+2), (x-3,y+3), (x-2,y+3), (x-1,y+3),\
-                                           (x,y+3), (x+1,y+3), (x-4,y+4), (x-3,y+4),\
-                                           (x-2,y+4), (x-1,y+4), (x,y+4), (x+1,y+4)])
-                
-            if x > 0 and x < self.board_dimension-4 and y > 3:
-                # Can have an up-left pattern
-                potential_patterns.append([(x-1,y), (x,y-1), (x-1,y-1), (x+2,y-2), (x+1,y-2),\
-                                           (x,y-2), (x-1,y-2), (x+3,y-3), (x+2,y-3), (x+1,y-3),\
-                                           (x,y-3), (x-1,y-3), (x+4,y-4), (x+3,y-4),\
-                                           (x+2,y-4), (x+1,y-4), (x,y-4), (x-1,y-4)])
-                
-        else:
-            if x > 4 and y < self.board_dimension-4:
-                # Can have a down-left pattern
-                potential_patterns.append([(x-1,y), (x-1,y+1), (x-2,y+1), (x,y+2), (x-1,y+2),\
-                                           (x-2,y+2), (x-3,y+2), (x,y+3), (x-1,y+3), (x-2,y+3),\
-                                           (x-3,y+3), (x-4,y+3), (x,y+4), (x-1,y+4),\
-                                           (x-2,y+4), (x-3,y+4), (x-4,y+4), (x-5,y+4)])
-                
-            if x < self.board_dimension-5 and y > 3:
-                # Can have an up-right pattern
-                potential_patterns.append([(x+1,y), (x+1,y-1), (x+2,y-1), (x,y-2), (x+1,y-2),\
-                                           (x+2,y-2), (x+3,y-2), (x,y-3), (x+1,y-3), (x+2,y-3),\
-                                           (x+3,y-3), (x+4,y-3), (x,y-4), (x+1,y-4),\
-                                           (x+2,y-4), (x+3,y-4), (x+4,y-4), (x+5,y-4)])
+        for pattern_id, cells, cells_mask, black_mask, any_mask, white_mask, connect_mask in self.templates[group][index]:
+            # The pattern needs its stones in place and all of its cells empty
+            if cells_mask & empty != cells_mask or black_mask & own != black_mask or white_mask & other != white_mask:
+                continue
+            if any_mask and not any_mask & own:
+                continue
+            if connect_mask:
+                if connected is None:
+                    connected = self.black_edge_mask | self.geometry.up_down_neighbours_of(own)
+                if connect_mask & ~connected:
+                    continue
+            return_list.append(Substrategy(pattern_id, cells))
         
-        # Ensure each potential pattern is empty and connected before adding it
-        for pattern in potential_patterns:
-            cells_to_check = pattern[12::]
-            if self.check_all_empty(pattern) and self.connected_ud_pattern(cells_to_check):
-                pattern = self.change_pattern(pattern) + [12]
-                if pattern not in return_list:
-                    return_list.append(pattern)
-                    
         return return_list
     
-    def connected_ud_pattern(self, pattern):
+    def connected_ud_pattern(self, cells):
         # Determines if all cells in potential patterns are connected up or down
         # Important to note this function does not allow side (same y) connections
-        all_connected = True
-        # Don't include the last element since it just identifies the pattern
-        for cell in pattern[0:len(pattern)-1]:
-            if self.board_dict[cell].is_black_edge():
-                continue
-            else:
-                nbrs = self.board_dict[cell].get_neighbours()
-                nbrs = [nbr for nbr in nbrs if not nbr[1] == cell[1]]
-                # Check the neighbour is connected above or below
-                connected = False
-                for nbr in nbrs:
-                    if self.board_dict[nbr].get_state() == BLACK:
-                        connected = True
-                        break
-                
-                if not connected:
-                    all_connected = False
-                    
-        # If all the cells connect up or down the pattern exists
-        if all_connected:
-            return True
-        else:
-            return False
+        # cells are cell indices (y*n + x), e.g. a Substrategy's cells
+        mask = 0
+        for cell in cells:
+            mask |= 1 << cell
+        # A cell is connected when it is on a black edge or has a black stone
+        # in the row above or below it
+        connected = self.black_edge_mask | self.geometry.up_down_neighbours_of(self.black_bits)
+        return mask & ~connected == 0
     
-    def check_all_empty(self, cells_to_check):
-        # Takes a list of cells and checks that each cell is unoccupied
-        # cells_to_check should be in coordinate form, not position
-        for cell in cells_to_check:
-            if self.board_dict[cell].get_state() != UNOCCUPIED:
-                # Cell is taken, all cells are not empty
+    def check_all_empty(self, cells):
+        # Takes cell indices (y*n + x), like connected_ud_pattern, and checks
+        # that each cell is unoccupied
+        mask = 0
+        for cell in cells:
+            if not 0 <= cell < self.geometry.cell_count:
+                # Cells off the board can never be played in
                 return False
-            
-        return True
+            mask |= 1 << cell
+        return mask & self.empty_bits == mask
     
     def reply_bridge(self, pattern, white_move):
         # Finds the replying move when a bridge has been threatened
-        if white_move in pattern:
+        cells = pattern.cells
+        move = cells[0]
+        if white_move in cells:
             self.substrategies.remove(pattern)
-            # Remove the white move so black can take the other cell
-            pattern.remove(white_move)
+            # Black takes the cell white didn't play in
+            if move == white_move:
+                move = cells[1]
         # Return the replying move
-        return pos_2_coord(pattern[0])
+        return index_2_coord(move, self.board_dimension)
         
+    def reply_hsearch(self, pattern, white_move):
+        # Restores a virtual connection white played in by taking the key of
+        # a semi-virtual connection between the same groups, the connection
+        # that leaves replaces the broken one
+        move, restored = self.hsearch.reply(pattern, white_move)
+        self.substrategies.remove(pattern)
+        if restored is not None:
+            self.substrategies.append(restored)
+        return index_2_coord(move, self.board_dimension)
+    
     def reply_two_part(self, pattern, white_move, split=3):
         # This function takes a pattern that can be broken into two parts, where
         # if played in one part the replying move is in the other part. The
         # replying moves are at the start of the split in each case
-        part1 = pattern[0:split]
-        part2 = pattern[split::]
+        part1 = pattern.cells[0:split]
+        part2 = pattern.cells[split::]
         
         if white_move in part1:
-            return pos_2_coord(part2[0])
+            return index_2_coord(part2[0], self.board_dimension)
         else:
-            return pos_2_coord(part1[0])
+            return index_2_coord(part1[0], self.board_dimension)
         
     def reply_pattern8(self, pattern, white_move):
         # This function replies to a threat in pattern 8 with a winning move
-        index = pattern.index(white_move)
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
         if index == 4 or index == 8:
-            move = pattern[2]
+            move = cells[2]
             # Add bridge and 432 pattern to substrategies
-            self.substrategies.append(pattern[0:2] + [2])
+            self.substrategies.append(Substrategy(2, cells[0:2]))
             four32 = self.indices_to_pattern(pattern, [5,9,10,7,3,6,11,12])
-            self.substrategies.append(four32 + [5])
+            self.substrategies.append(Substrategy(5, four32))
         elif index == 9:
-            move = pattern[4]
+            move = cells[4]
             pattern10 = self.indices_to_pattern(pattern, [0,1,2,5,6,8,10,11])
-            self.substrategies.append(pattern10 + [10])
+            self.substrategies.append(Substrategy(10, pattern10))
         else:
-            move = pattern[4]
+            move = cells[4]
             # Bridge pattern
-            self.substrategies.append(pattern[8:10] + [2])
+            self.substrategies.append(Substrategy(2, cells[8:10]))
             
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def reply_pattern10(self, pattern, white_move):
         # Makes a replying move in the 10th pattern
         # Pattern 10 is a decomposed pattern of pattern 8, it is Local Pattern 15
         # in Hayward's document
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
-        if pattern.index(white_move) == 5:
+        if index == 5:
             # Still needs further decomposition
-            move = pattern[4]
-            self.substrategies.append(pattern[6:8] + [2])
-            self.substrategies.append(pattern[0:4] + [11])
+            move = cells[4]
+            self.substrategies.append(Substrategy(2, cells[6:8]))
+            self.substrategies.append(Substrategy(11, cells[0:4]))
         else:
             # No decomposition needed, connection complete
-            move = pattern[5]
+            move = cells[5]
             
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def reply_pattern11(self, pattern, white_move):
         # Makes a replying move in the 11th pattern
         # Pattern 11 is a decomposed pattern of pattern 10, it is Local Pattern 25
         # in Hayward's document
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
-        if pattern.index(white_move) == 3:
+        if index == 3:
             # One bridge still remains, add it to substrategies
-            move = pattern[2]
-            self.substrategies.append(pattern[0:2] + [2])
+            move = cells[2]
+            self.substrategies.append(Substrategy(2, cells[0:2]))
         else:
             # Decomposition completed, pattern connected
-            move = pattern[3]
+            move = cells[3]
             
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def reply_pattern12(self, pattern, white_move):
         # Makes a replying move in the 12th pattern
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
-        index = pattern.index(white_move)
         
         if index == 3 or index == 7 or index == 8 or index == 12 or index == 13:
-            move = pattern[5]
-            self.substrategies.append([pattern[1], pattern[4], 2])
+            move = cells[5]
+            self.substrategies.append(Substrategy(2, (cells[1], cells[4])))
             four32 = self.indices_to_pattern(pattern, [9,14,15,11,6,10,16,17])
-            self.substrategies.append(four32 + [5])
+            self.substrategies.append(Substrategy(5, four32))
         
         elif index == 14:
-            move = pattern[7]
-            self.substrategies.append(pattern[12:14] + [2])
+            move = cells[7]
+            self.substrategies.append(Substrategy(2, cells[12:14]))
             pattern13 = self.indices_to_pattern(pattern, [3,4,5,8,9,10,15,16])
-            self.substrategies.append(pattern13 + [13])
+            self.substrategies.append(Substrategy(13, pattern13))
             
         elif index == 4:
-            move = pattern[3]
+            move = cells[3]
             pattern14 = self.indices_to_pattern(pattern, [0,1,2,5,6,7,8,9,10,12,13,14,15,16])
-            self.substrategies.append(pattern14 + [14])
+            self.substrategies.append(Substrategy(14, pattern14))
             
         else:
-            move = pattern[8]
-            self.substrategies.append(pattern[3:5] + [2])
-            self.substrategies.append(pattern[13:15] + [2])
+            move = cells[8]
+            self.substrategies.append(Substrategy(2, cells[3:5]))
+            self.substrategies.append(Substrategy(2, cells[13:15]))
             
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def reply_pattern13(self, pattern, white_move):
         # Makes a replying move in the 13th pattern
         # Pattern 13 is a decomposition of pattern 12. It is Local Pattern 9 in
         # the Hayward document
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
-        if pattern.index(white_move) == 0:
-            move = pattern[1]
+        if index == 0:
+            move = cells[1]
             pattern15 = self.indices_to_pattern(pattern, [2,3,4,5,6,7])
-            self.substrategies.append(pattern15 + [15])
+            self.substrategies.append(Substrategy(15, pattern15))
             
         else:
             # Decomposition complete, pattern done
-            move = pattern[0]
+            move = cells[0]
             
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def reply_pattern14(self, pattern, white_move):
         # Make a replying move in pattern 14
         # Pattern 14 is Local Pattern 16 in the Hayward document
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
-        index = pattern.index(white_move)
         if index == 5:
-            move = pattern[6]
-            self.substrategies.append(pattern[10:12] + [2])
+            move = cells[6]
+            self.substrategies.append(Substrategy(2, cells[10:12]))
         
         elif index == 6:
-            move = pattern[5]
-            self.substrategies.append(pattern[9:11] + [2])
+            move = cells[5]
+            self.substrategies.append(Substrategy(2, cells[9:11]))
             
         elif index == 10:
-            move = pattern[6]
+            move = cells[6]
             pattern16 = self.indices_to_pattern(pattern, [0,1,2,3,4,7,8,11,12,13])
-            self.substrategies.append(pattern16 + [16])
+            self.substrategies.append(Substrategy(16, pattern16))
             
         else:
-            move = pattern[10]
-            self.substrategies.append(pattern[5:7] + [2])
+            move = cells[10]
+            self.substrategies.append(Substrategy(2, cells[5:7]))
             
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def reply_pattern15(self, pattern, white_move):
         # Make a replying move in pattern 15
         # Pattern 15 is Local Pattern 18 in the Hayward document
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
-        if pattern.index(white_move) == 1:
-            move = pattern[3]
-            self.substrategies.append([pattern[0], pattern[2], [2]])
-            self.substrategies.append(pattern[4:6] + [2])
+        if index == 1:
+            move = cells[3]
+            self.substrategies.append(Substrategy(2, (cells[0], cells[2])))
+            self.substrategies.append(Substrategy(2, cells[4:6]))
             
         else:
             # Pattern completed, no decomposition to be done
-            move = pattern[1]
+            move = cells[1]
             
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def reply_pattern16(self, pattern, white_move):
         # Makes a replying move in the 16 pattern
         # Pattern 16 is Local Pattern 26 in the Hayward document
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
-        if pattern.index(white_move) == 7:
-            move = pattern[6]
-            self.substrategies.append(pattern[8:10] + [2])
+        if index == 7:
+            move = cells[6]
+            self.substrategies.append(Substrategy(2, cells[8:10]))
             pattern17 = self.indices_to_pattern(pattern, [1,2,3,4,5,6])
-            self.substrategies.append(pattern17 + [17])
+            self.substrategies.append(Substrategy(17, pattern17))
             
         else:
             # Decomposition completed
-            move = pattern[7]
+            move = cells[7]
             
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def reply_pattern17(self, pattern, white_move):
         # Makes a replying move in pattern 17
         # Pattern 17 is Local Pattern 32 in the Hayward document
+        cells = pattern.cells
+        index = cells.index(white_move)
         self.substrategies.remove(pattern)
-        if pattern.index(white_move) == 5:
-            move = pattern[2]
-            self.substrategies.append(pattern[0:2] + [2])
-            self.substrategies.append(pattern[3:5] + [2])
+        if index == 5:
+            move = cells[2]
+            self.substrategies.append(Substrategy(2, cells[0:2]))
+            self.substrategies.append(Substrategy(2, cells[3:5]))
             
         else:
             # Decomposition completed
-            move = pattern[5]
+            move = cells[5]
         
-        return pos_2_coord(move)
+        return index_2_coord(move, self.board_dimension)
     
     def indices_to_pattern(self, pattern, indices):
-        # Takes a list of indices and makes a new pattern from the previous one
-        # Used for decomposing patterns
-        return_pattern = []
-        for index in indices:
-            return_pattern.append(pattern[index])
-        return return_pattern
-    
-    def change_pattern(self, pattern):
-        if type(pattern[0]) == str:
-            # Converts a pattern from a list of positions to a list of coordinates
-            for i in range(len(pattern)):
-                pattern[i] = pos_2_coord(pattern[i])
-                
-        else:
-            # Converts a pattern from a list of coordinates to a list of positions
-            for i in range(len(pattern)):
-                pattern[i] = coord_2_pos(pattern[i][0], pattern[i][1])
-        return pattern
+        # Takes a list of indices and returns those cells of the pattern, used
+        # for decomposing patterns
+        return tuple(pattern.cells[index] for index in indices)
 
 # representation of individual board cells
 class HexCell():
-    # initialize cell position and state
+    # A cell is only a position on a board, the state is read from the board's
+    # bitboards and the neighbours, bridges and edges from the board's shared
+    # geometry
     # states: 0 - unoccupied, 1 - black occupied, 2 - white occupied
-    def __init__(self, x, y, board_dimension, state=UNOCCUPIED):
+    __slots__ = ('x', 'y', 'index', 'board')
+    
+    def __init__(self, x, y, board):
         
         self.x = x
         self.y = y
-        # State is black, white, or unoccupied
-        self.state = state
-        self.board_dimension = board_dimension
-
-        # BLACK_EDGE is true if the cell is either the first or last row
-        self.BLACK_EDGE = False
-        # WHITE_EDGE is true if the cell is either the first or last column
-        self.WHITE_EDGE = False
-        if self.x == 0 or self.x == self.board_dimension-1:
-            self.WHITE_EDGE = True
-        if self.y == 0 or self.y == self.board_dimension-1:
-            self.BLACK_EDGE = True
-            
-        # Keeps track of 3 of the cells neighbours
-        self.neighbours = [(x+1,y), (x+1,y-1), (x,y+1), (x,y-1), (x-1,y),(x-1,y+1)]
-        self.neighbours = [coord for coord in self.neighbours if not \
-                           (coord[0] < 0 or coord[0] >= self.board_dimension or coord[1] < 0 or coord[1] >= self.board_dimension)]
-
-        self.bridges = [(x+1,y+1), (x-1,y+2), (x-2,y+1)]
-        self.bridges = [coord for coord in self.bridges if not \
-                           (coord[0] < 0 or coord[0] >= self.board_dimension or coord[1] < 0 or coord[1] >= self.board_dimension)]
-        
-        self.four32 = self.generate_432_patterns(x,y)
+        self.index = y*board.board_dimension + x
+        self.board = board
         
     def set_state(self, state):
-        self.state = state
+        # Puts a stone of state on the cell. Stones are never taken off the
+        # board, so the cell has to be empty and state a colour
+        if state != BLACK and state != WHITE:
+            raise ValueError("a cell can only be set to black or white")
+        if self.board.get_state(self.x, self.y) != UNOCCUPIED:
+            raise ValueError("cell %s is already occupied" % coord_2_pos(self.x, self.y))
+        self.board.set_stone(self.x, self.y, state)
         
     def get_neighbours(self):
-        return self.neighbours
+        return self.board.geometry.neighbour_coords[self.index]
     
     def get_bridges(self):
-        return self.bridges
+        return self.board.geometry.bridge_coords[self.index]
     
     def get_432(self):
-        return self.four32
+        return self.board.geometry.four32[self.index]
     
     def get_state(self):
-        return self.state
+        return self.board.get_state(self.x, self.y)
     
     def is_black_edge(self):
-        return self.BLACK_EDGE
+        # True if the cell is either the first or last row
+        return self.board.geometry.black_edge[self.index]
     
-    def generate_432_patterns(self, x, y):
-        # Generates top to bottom 432 patterns
-        four32 = [[(x-1,y+1),(x-2,y+2),(x-1,y+2), (x+1,y+1),(x+1,y),(x,y+1),(x,y+2),(x+1,y+2)],\
-                  [(x,y+1),(x,y+2),(x-1,y+2), (x-2,y+1),(x-1,y),(x-1,y+1),(x-3,y+2),(x-2,y+2)],\
-                  [(x,y-1),(x,y-2),(x+1,y-2), (x+2,y-1),(x+1,y),(x+1,y-1),(x+2,y-2),(x+3,y-2)],\
-                  [(x+1,y-1),(x+1,y-2),(x+2,y-2), (x-1,y-1),(x-1,y),(x,y-1),(x-1,y-2),(x,y-2)]]
-        
-        # Goes through the four32 array and removes any patterns that have invalid
-        # coordinates contained in them
-        rm_list = []            
-        for pattern in four32:
-            new_pattern = [coord for coord in pattern if not \
-                       (coord[0] < 0 or coord[0] >= self.board_dimension or coord[1] < 0 or coord[1] >= self.board_dimension)]            
-            if len(new_pattern) < 8:
-                # One coordinate was invalid, entire pattern does not work now
-                rm_list.append(pattern)
-        while len(rm_list) > 0:
-            # Remove the pattern
-            four32.remove(rm_list[0])
-            rm_list.remove(rm_list[0])
-        
-        return four32
+    def is_white_edge(self):
+        # True if the cell is either the first or last column
+        return self.board.geometry.white_edge[self.index]
     
     def __repr__(self):
         # Represent in board coordinate form
         return coord_2_pos(self.x,self.y)
     
-def coord_2_pos(x,y):
-    # Changes a coordinate into board coordinate form
-    pos_dict = {0: "a", 1: "b", 2: "c", 3: "d", 4: "e", 5: "f", 6: "g", 7: "h"}
-    x = pos_dict[x]
-    y = str(y+1)
-    return x + y
+# board_dict of a HexBoard
+class CellView(Mapping):
+    # Read-only mapping from x,y to the HexCell at that position. Cells are
+    # created when looked up, iteration follows the column-major order the
+    # board has always used
+    __slots__ = ('board',)
+    
+    def __init__(self, board):
+        self.board = board
+    
+    def __getitem__(self, pos):
+        if pos not in self.board.cell_masks:
+            raise KeyError(pos)
+        return HexCell(pos[0], pos[1], self.board)
+    
+    def __iter__(self):
+        return iter(self.board.geometry.column_major_coords)
+    
+    def __len__(self):
+        return self.board.geometry.cell_count
+    
+    def __contains__(self, pos):
+        return pos in self.board.cell_masks
+
+# A pattern black can complete, as a record of its pattern id and the indices
+# (y*n + x) of its empty cells in the order the replies read them
+class Substrategy(NamedTuple):
+    pattern_id: int
+    cells: tuple
+    
+    def to_positions(self, board_dimension):
+        # Returns the pattern in its printed form, the cell positions followed
+        # by the pattern id
+        positions = coords.positions_by_index(board_dimension)
+        return [positions[cell] for cell in self.cells] + [self.pattern_id]
+
+# The live substrategies of a board, kept in the order they were added
+class StrategySet():
+    # Behaves like a list of Substrategy records without duplicates, and keeps
+    # an inverted index from each cell to the records that use it, so finding
+    # or removing the patterns on a cell doesn't scan the whole set. Every
+    # record gets an increasing sequence number when added, a record put back
+    # by an undo gets its old number and so its old place in the order
+    def __init__(self, board_dimension, patterns=()):
+        self.board_dimension = board_dimension
+        # Each record to its sequence number
+        self.strategies = {}
+        # Cell index to the records using it and their sequence numbers
+        self.cell_index = {}
+        self.next_seq = 0
+        # The move frame of the board while a move is played with
+        # HexBoard.play, every add and remove is written to it
+        self.journal = None
+        for pattern in patterns:
+            self.append(pattern)
+    
+    def append(self, pattern, seq=None):
+        # Adds a record, a record that is already live is left where it is
+        if pattern in self.strategies:
+            return
+        if seq is None:
+            seq = self.next_seq
+            self.next_seq += 1
+        self.insert(pattern, seq)
+        if self.journal is not None:
+            self.journal.append(('add', pattern, seq))
+    
+    def remove(self, pattern):
+        if pattern not in self.strategies:
+            raise ValueError("substrategy not in StrategySet")
+        seq = self.delete(pattern)
+        if self.journal is not None:
+            self.journal.append(('remove', pattern, seq))
+    
+    def insert(self, pattern, seq):
+        # Adds a record with the given sequence number, without journaling
+        self.strategies[pattern] = seq
+        for cell in pattern.cells:
+            self.cell_index.setdefault(cell, {})[pattern] = seq
+    
+    def delete(self, pattern):
+        # Removes a record without journaling, returns its sequence number
+        seq = self.strategies.pop(pattern)
+        for cell in pattern.cells:
+            using = self.cell_index[cell]
+            del using[pattern]
+            if not using:
+                del self.cell_index[cell]
+        return seq
+    
+    def containing(self, cell):
+        # Returns the patterns that use cell, oldest first
+        using = self.cell_index.get(cell)
+        if not using:
+            return []
+        return sorted(using, key=using.get)
+    
+    def discard_cell(self, cell):
+        # Removes every pattern that uses cell
+        for pattern in self.containing(cell):
+            self.remove(pattern)
+    
+    def copy(self):
+        # Returns an independent set with the same records and order
+        other = StrategySet(self.board_dimension)
+        other.strategies = dict(self.strategies)
+        other.cell_index = {cell: dict(using) for cell, using in self.cell_index.items()}
+        other.next_seq = self.next_seq
+        return other
+    
+    def ordered(self):
+        # The records, oldest first
+        return sorted(self.strategies, key=self.strategies.get)
+    
+    def __iter__(self):
+        return iter(self.ordered())
+    
+    def __len__(self):
+        return len(self.strategies)
+    
+    def __getitem__(self, i):
+        # Positional access, used by random.choice
+        return self.ordered()[i]
+    
+    def __contains__(self, pattern):
+        return pattern in self.strategies
+    
+    def __repr__(self):
+        # Printed with board positions, like the lists of positions patterns
+        # used to be
+        return repr([pattern.to_positions(self.board_dimension) for pattern in self.ordered()])
+
+def mask_indices(mask):
+    # Yields the index of every set bit in mask, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def index_2_coord(index, board_dimension):
+    # Changes a cell index (y*n + x) into normal coordinates
+    return (index % board_dimension, index // board_dimension)
+
+def index_2_pos(index, board_dimension):
+    # Changes a cell index (y*n + x) into board coordinate form
+    return coords.positions_by_index(board_dimension)[index]
+
+def detect_win_batch(boards):
+    # Returns the winner of every board in a stack of n x n boards, an array
+    # (B, n, n) of cell states, as an array of 1 (black), 2 (white) or 0 (no
+    # one), like detect_win does for a single board
+    boards = np.asarray(boards)
+    black = connects_rows_batch(boards == BLACK)
+    # Swapping x and y maps the hex neighbours onto themselves, so white's
+    # columns are connected exactly when the transposed stones connect rows
+    white = connects_rows_batch(np.swapaxes(boards == WHITE, 1, 2))
+    return np.where(black, BLACK, np.where(white, WHITE, UNOCCUPIED)).astype(np.int8)
+
+def connects_rows_batch(stones):
+    # For a stack of boolean boards (B, n, n) returns a boolean array, true
+    # where the stones connect the first and last row. Every row is packed
+    # into one 64 bit word, bit x for column x, and the cells reached from
+    # the first row grow one step in every hex direction per pass until no
+    # board changes
+    rows = pack_rows(stones)
+    one = np.uint64(1)
+    reached = np.zeros_like(rows)
+    reached[:, 0] = rows[:, 0]
+    while True:
+        # (x-1, y) and (x+1, y), then (x, y-1) and (x+1, y-1) from the row
+        # above and (x, y+1) and (x-1, y+1) from the row below
+        grown = reached | (reached << one) | (reached >> one)
+        grown[:, 1:] |= reached[:, :-1] | (reached[:, :-1] >> one)
+        grown[:, :-1] |= reached[:, 1:] | (reached[:, 1:] << one)
+        grown &= rows
+        if np.array_equal(grown, reached):
+            return reached[:, -1] != 0
+        reached = grown
 
-def pos_2_coord(pos):
-    # Changes a board coordinate into normal coordinates
-    pos_dict = {"a": 0, "b": 1, "c": 2, "d": 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7}
-    x = pos_dict[pos[0]]
-    y = pos[1]
-    return (int(x), int(y)-1)
+def pack_rows(stones):
+    # Packs a stack of boolean boards (B, n, n), n at most 64, into an array
+    # (B, n) of 64 bit words with bit x set for a stone in column x
+    count, n = stones.shape[:2]
+    packed = np.packbits(stones, axis=2, bitorder='little')
+    words = np.zeros((count, n, 8), dtype=np.uint8)
+    words[:, :, :packed.shape[2]] = packed
+    return words.view('<u8').reshape(count, n)
@@ -212,6 +212,8 @@ class HexBoard():
 class HexCell():
     """Class representation of an individual HexBoard Cell
     """
+    __slots__ = ('x', 'y', 'owner')
+
     def __init__(self, column, row, owner=UNOCCUPIED):
         self.x = column
         self.y = row
@@ -0,0 +1,99 @@
+# Batched random playouts
+#
+# A full Hex board always has exactly one winner, so a random playout doesn't
+# need to look for a win after every stone. It can fill every empty cell at
+# once, the colours taking turns in a random order, and check for a winner
+# once at the end. This does many playouts together as NumPy arrays:
+#   - a random permutation of the empty cells per playout, from argsort of
+#     random keys, decides which colour gets each cell
+#   - the full boards are stacked into one (B, n, n) array
+#   - black's connection is found for all of them together by growing the
+#     cells reached from the first row until nothing changes, see
+#     patterns.connects_rows_batch
+#
+# The result is a PlayoutStats with the win counts and, per cell, how often
+# it ended up black and how often it belonged to the winner. From those come
+# ownership maps and the criticality of every cell, used to rank moves.
+#
+# Example: stats = playouts.run_playouts(board, 4096, seed=1)
+
+import numpy as np
+import patterns
+
+# Playouts done per array batch
+BATCH_SIZE = 1024
+
+class PlayoutStats():
+    def __init__(self, board_dimension):
+        n = board_dimension
+        self.board_dimension = n
+        self.playouts = 0
+        self.black_wins = 0
+        # Per cell counts of playouts where the cell was black, and where the
+        # cell's colour was the winner's
+        self.black_owned = np.zeros((n, n), dtype=np.int64)
+        self.winner_owned = np.zeros((n, n), dtype=np.int64)
+
+    def add(self, boards, black_won):
+        # Adds a batch of full boards (B, n, n) and their results
+        self.playouts += len(boards)
+        self.black_wins += int(black_won.sum())
+        black = boards == patterns.BLACK
+        self.black_owned += black.sum(axis=0)
+        winner = np.where(black_won, patterns.BLACK, patterns.WHITE)[:, None, None]
+        self.winner_owned += (boards == winner).sum(axis=0)
+
+    def win_rate(self, color=patterns.BLACK):
+        # Share of the playouts won by color
+        if not self.playouts:
+            return 0.0
+        rate = self.black_wins / self.playouts
+        return rate if color == patterns.BLACK else 1.0 - rate
+
+    def ownership(self, color=patterns.BLACK):
+        # (n, n) array, the share of playouts in which each cell was color
+        if not self.playouts:
+            return np.zeros((self.board_dimension,)*2)
+        black = self.black_owned / self.playouts
+        return black if color == patterns.BLACK else 1.0 - black
+
+    def criticality(self):
+        # (n, n) array, how much more often a cell belongs to the winner than
+        # it would if owning it had nothing to do with winning
+        if not self.playouts:
+            return np.zeros((self.board_dimension,)*2)
+        black_rate = self.black_wins / self.playouts
+        black = self.black_owned / self.playouts
+        expected = black * black_rate + (1.0 - black) * (1.0 - black_rate)
+        return self.winner_owned / self.playouts - expected
+
+    def ranked_moves(self, board):
+        # The empty cells of board as x,y, most critical first
+        critical = self.criticality()
+        return sorted(board.unoccupied, key=lambda cell: -critical[cell[1], cell[0]])
+
+def run_playouts(board, playouts, to_move=None, seed=None, batch_size=BATCH_SIZE):
+    # Plays random playouts from the board's position and returns their
+    # PlayoutStats. to_move defaults to the board's side to move
+    n = board.board_dimension
+    if to_move is None:
+        to_move = board.to_move
+    other = patterns.WHITE if to_move == patterns.BLACK else patterns.BLACK
+    rng = np.random.default_rng(seed)
+    start = np.asarray(board.board_array, dtype=np.int8).reshape(n*n)
+    empty = np.flatnonzero(start == patterns.UNOCCUPIED)
+    # The colour given to the cell at each place of the random order
+    order_colours = np.where(np.arange(len(empty)) % 2 == 0, to_move, other).astype(np.int8)
+
+    stats = PlayoutStats(n)
+    done = 0
+    while done < playouts:
+        size = min(batch_size, playouts - done)
+        boards = np.tile(start, (size, 1))
+        if len(empty):
+            order = np.argsort(rng.random((size, len(empty))), axis=1)
+            boards[np.arange(size)[:, None], empty[order]] = order_colours
+        boards = boards.reshape(size, n, n)
+        stats.add(boards, patterns.connects_rows_batch(boards == patterns.BLACK))
+        done += size
+    return stats
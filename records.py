@@ -0,0 +1,295 @@
+# Game records
+#
+# Finished games are appended to an archive file so they can be replayed and
+# analysed again later, for instance with a newer pattern table. The file is
+#   header  - magic and format version, '<8sH'
+#   records - one per game, each a varint byte length followed by
+#               varint board size, first colour and winner (0 if unfinished)
+#               the black and white player names, varint length and UTF-8
+#               the moves, one varint cell index (y*n + x) each, the colours
+#               taking turns from the first colour
+# Varints are unsigned LEB128, so every move on boards up to 11x11 takes one
+# byte. Records are only ever appended. A record cut short by a crash is
+# dropped by the reader and cut off by the next writer.
+#
+# read_records streams the records of an archive, a block of the file at a
+# time, and replay walks a record through a HexBoard one move at a time, so
+# archives of any size are read with a constant amount of memory.
+# record_spans finds where each record starts and ends without decoding any,
+# so an archive can be split between worker processes.
+#
+# Example: python records.py games.bin --sgf games.sgf
+
+import argparse
+import os
+import struct
+import coords
+import patterns
+
+MAGIC = b'HEXGAME\0'
+VERSION = 1
+HEADER = struct.Struct('<8sH')
+# Bytes read from an archive at a time
+READ_SIZE = 1 << 20
+
+class GameRecord():
+    def __init__(self, board_dimension, moves, black='patterns', white='', first=patterns.BLACK, winner=0):
+        self.board_dimension = board_dimension
+        # Cell indices in the order they were played
+        self.moves = list(moves)
+        self.black = black
+        self.white = white
+        self.first = first
+        self.winner = winner
+
+    def colours(self):
+        # The colour of every move
+        second = patterns.WHITE if self.first == patterns.BLACK else patterns.BLACK
+        return [self.first if i % 2 == 0 else second for i in range(len(self.moves))]
+
+    def coords(self):
+        # The moves as x,y
+        return [patterns.index_2_coord(index, self.board_dimension) for index in self.moves]
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __eq__(self, other):
+        return isinstance(other, GameRecord) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return 'GameRecord(%dx%d, %s vs %s, %d moves, winner %d)' % (
+            self.board_dimension, self.board_dimension, self.black, self.white, len(self.moves), self.winner)
+
+def record_from_board(board, black='patterns', white=''):
+    # The record of the game played on a HexBoard so far. Every stone has to
+    # have been placed in turn, each colour after the other
+    history = board.history
+    n = board.board_dimension
+    first = patterns.BLACK
+    if history:
+        first = int(board.board_array[history[0] // n][history[0] % n])
+    return GameRecord(n, history, black, white, first, board.detect_win())
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, offset):
+    # (value, offset after it), raises IndexError when data ends first
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def encode(record):
+    # The payload of a record, without its length
+    out = bytearray()
+    write_varint(out, record.board_dimension)
+    write_varint(out, record.first)
+    write_varint(out, record.winner)
+    for name in (record.black, record.white):
+        name = name.encode('utf-8')
+        write_varint(out, len(name))
+        out += name
+    for index in record.moves:
+        write_varint(out, index)
+    return bytes(out)
+
+def decode(payload):
+    # The GameRecord of a payload
+    board_dimension, offset = read_varint(payload, 0)
+    first, offset = read_varint(payload, offset)
+    winner, offset = read_varint(payload, offset)
+    names = []
+    for i in range(2):
+        length, offset = read_varint(payload, offset)
+        names.append(payload[offset:offset + length].decode('utf-8'))
+        offset += length
+    rest = payload[offset:]
+    if max(rest, default=0) < 0x80:
+        # Every move takes one byte, boards up to 11x11
+        moves = list(rest)
+    else:
+        moves = []
+        end = len(payload)
+        while offset < end:
+            index, offset = read_varint(payload, offset)
+            moves.append(index)
+    return GameRecord(board_dimension, moves, names[0], names[1], first, winner)
+
+def check_header(f, path):
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError("%s has no record header" % path)
+    magic, version = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("%s is not a version %d game record file" % (path, VERSION))
+
+def record_spans(path):
+    # Yields the (start, end) file offsets of every complete record, reading
+    # only the lengths and seeking over the records
+    with open(path, 'rb') as f:
+        check_header(f, path)
+        size = os.fstat(f.fileno()).st_size
+        offset = HEADER.size
+        while offset < size:
+            f.seek(offset)
+            try:
+                length, used = read_varint(f.read(10), 0)
+            except IndexError:
+                return
+            if offset + used + length > size:
+                return
+            yield offset, offset + used + length
+            offset += used + length
+
+def read_records(path, offset=None, count=None):
+    # Yields the GameRecords of an archive, starting at the record at offset
+    # (from record_spans) and stopping after count of them if given
+    with open(path, 'rb') as f:
+        check_header(f, path)
+        if offset is not None:
+            f.seek(offset)
+        data = b''
+        position = 0
+        read = 0
+        while count is None or read < count:
+            try:
+                length, start = read_varint(data, position)
+                complete = start + length <= len(data)
+            except IndexError:
+                complete = False
+            if not complete:
+                block = f.read(READ_SIZE)
+                if not block:
+                    # The end of the file, or a record cut short
+                    return
+                data = data[position:] + block
+                position = 0
+                continue
+            yield decode(data[start:start + length])
+            position = start + length
+            read += 1
+
+class RecordWriter():
+    # Appends records to an archive, creating it if needed
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION))
+        else:
+            # Cut off a record a crashed writer left unfinished
+            end = HEADER.size
+            for start, end in record_spans(path):
+                pass
+            if end < os.path.getsize(path):
+                os.truncate(path, end)
+        self.file = open(path, 'ab')
+
+    def write(self, record):
+        payload = encode(record)
+        out = bytearray()
+        write_varint(out, len(payload))
+        self.file.write(bytes(out) + payload)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def append_records(path, records):
+    # Appends an iterable of GameRecords to an archive
+    with RecordWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+
+def replay(record, board=None, respond=False):
+    # Replays a record on a HexBoard, by default a new one, yielding
+    # (board, x, y, color) after every move. Black's recorded moves are
+    # played and the substrategies are kept up to date as place_stone
+    # would, but the patterns are never asked for a reply. With respond
+    # only the white moves are replayed, through place_stone, so black
+    # answers them with the current patterns; the replay stops when white's
+    # next cell is already taken
+    n = record.board_dimension
+    if board is None:
+        board = patterns.HexBoard(n)
+    for i, (index, color) in enumerate(zip(record.moves, record.colours())):
+        if board.detect_win() != 0:
+            return
+        x, y = patterns.index_2_coord(index, n)
+        if respond:
+            if color == patterns.BLACK and i > 0:
+                # Black's own replies come from place_stone
+                continue
+            if not board.empty_bits >> index & 1:
+                return
+            board.place_stone(x, y, color)
+            if color == patterns.BLACK:
+                board.find_substrategies()
+        elif color == patterns.BLACK:
+            board.place_stone(x, y, patterns.BLACK)
+            if len(board.substrategies) == 0:
+                board.find_substrategies()
+        else:
+            board.set_stone(x, y, patterns.WHITE)
+            board.discard_strategies(x, y)
+        yield board, x, y, color
+
+def replay_all(path, respond=False):
+    # Yields (record, board) with every record of an archive replayed to its
+    # end, one board at a time
+    for record in read_records(path):
+        board = None
+        for board, x, y, color in replay(record, respond=respond):
+            pass
+        yield record, board
+
+def to_sgf(record):
+    # The game as SGF text, as HexGui reads it
+    n = record.board_dimension
+    result = {patterns.BLACK: 'B+', patterns.WHITE: 'W+'}.get(record.winner)
+    text = '(;FF[4]GM[11]SZ[%d]PB[%s]PW[%s]' % (n, record.black, record.white)
+    if result:
+        text += 'RE[%s]' % result
+    for (x, y), color in zip(record.coords(), record.colours()):
+        text += ';%s[%s]' % ('B' if color == patterns.BLACK else 'W', coords.coord_2_pos(x, y))
+    return text + ')\n'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise or export a game record archive")
+    parser.add_argument('path')
+    parser.add_argument('--sgf', help="write every game to this SGF file")
+    args = parser.parse_args(argv)
+
+    games = moves = 0
+    wins = {0: 0, patterns.BLACK: 0, patterns.WHITE: 0}
+    out = open(args.sgf, 'w') if args.sgf else None
+    try:
+        for record in read_records(args.path):
+            games += 1
+            moves += len(record)
+            wins[record.winner] += 1
+            if out is not None:
+                out.write(to_sgf(record))
+    finally:
+        if out is not None:
+            out.close()
+    print('%d games, %d moves, black %d white %d unfinished %d'
+          % (games, moves, wins[patterns.BLACK], wins[patterns.WHITE], wins[0]))
+
+if __name__ == "__main__":
+    main()
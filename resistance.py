@@ -0,0 +1,173 @@
+# Resistance evaluation
+#
+# The classic Hex evaluation: the board is a network of resistors and a
+# player is doing well when current flows easily between their two edges.
+# Seen from one player, every cell is a node with a resistance of
+#   OWN_RESISTANCE    for the player's own stones
+#   EMPTY_RESISTANCE  for empty cells
+#   OTHER_RESISTANCE  for the opponent's stones, large enough to block
+# two neighbouring cells are joined by a resistor of the sum of their
+# resistances and each edge is joined to the cells along it. The edge to edge
+# resistance comes from solving the network's Laplacian for the cell
+# voltages with one edge at 1 and the other at 0. A position is worth
+# log(white resistance / black resistance), positive when black is ahead.
+#
+# Cells are numbered y*n + x, so every neighbour of a cell is in its own row
+# or the rows next to it and the Laplacian is block tridiagonal, an n x n
+# block per row. It is solved by block elimination, n solves of n x n blocks,
+# O(n^4) instead of O(n^6) for a dense solve, done for a whole stack of
+# positions at once so evaluating every candidate move costs about as much
+# Python as evaluating one. White's resistance is black's on the transposed
+# board, swapping x and y maps the hex neighbours onto themselves.
+#
+# The index arrays for a board size are built once by get_structure and
+# shared. A HexBoard uses the evaluator once one is set as its evaluator, see
+# HexBoard.fallback_move.
+
+import numpy as np
+import geometry
+import patterns
+
+OWN_RESISTANCE = 0.001
+EMPTY_RESISTANCE = 1.0
+OTHER_RESISTANCE = 10000.0
+# Positions solved together
+BATCH_SIZE = 256
+
+class ResistanceStructure():
+    # Everything about the network that only depends on the board size
+    def __init__(self, board_dimension):
+        n = board_dimension
+        self.board_dimension = n
+        self.cell_count = n*n
+        # Every pair of neighbouring cells once, first cell smaller
+        pairs = sorted((index, y*n + x)
+                       for index, cells in enumerate(geometry.get_geometry(n).neighbour_coords)
+                       for x, y in cells if y*n + x > index)
+        first = np.array([pair[0] for pair in pairs], dtype=np.intp)
+        second = np.array([pair[1] for pair in pairs], dtype=np.intp)
+        self.first = first
+        self.second = second
+        # Cell to pair incidence, for summing the conductances at each cell
+        self.incidence = np.zeros((len(pairs), self.cell_count))
+        self.incidence[np.arange(len(pairs)), first] = 1.0
+        self.incidence[np.arange(len(pairs)), second] = 1.0
+        # Pairs within a row go in that row's diagonal block, the others
+        # join a row to the next one and go in the block between them
+        same_row = first // n == second // n
+        self.row_pairs = np.flatnonzero(same_row)
+        self.row_index = (first[same_row] // n, first[same_row] % n, second[same_row] % n)
+        self.next_pairs = np.flatnonzero(~same_row)
+        self.next_index = (first[~same_row] // n, first[~same_row] % n, second[~same_row] % n)
+        # The cells along the first and last row
+        self.source = np.zeros(self.cell_count)
+        self.source[:n] = 1.0
+        self.sink = np.zeros(self.cell_count)
+        self.sink[n*(n-1):] = 1.0
+
+# Structures by board size
+structures = {}
+
+def get_structure(board_dimension):
+    structure = structures.get(board_dimension)
+    if structure is None:
+        structure = structures[board_dimension] = ResistanceStructure(board_dimension)
+    return structure
+
+def resistances(boards, color=patterns.BLACK):
+    # Edge to edge resistance for color of every board in a stack (B, n, n)
+    boards = np.asarray(boards)
+    if color == patterns.WHITE:
+        boards = np.swapaxes(boards, 1, 2)
+    count, n = boards.shape[:2]
+    structure = get_structure(n)
+    cells = boards.reshape(count, n*n)
+    other = patterns.WHITE if color == patterns.BLACK else patterns.BLACK
+    cell_resistance = np.where(cells == color, OWN_RESISTANCE,
+                               np.where(cells == other, OTHER_RESISTANCE, EMPTY_RESISTANCE))
+    result = np.empty(count)
+    for start in range(0, count, BATCH_SIZE):
+        part = cell_resistance[start:start + BATCH_SIZE]
+        result[start:start + BATCH_SIZE] = network_resistance(structure, part)
+    return result
+
+def network_resistance(structure, cell_resistance):
+    # Solves the networks for a stack of cell resistances (B, n*n)
+    count = len(cell_resistance)
+    n = structure.board_dimension
+    pair = 1.0 / (cell_resistance[:, structure.first] + cell_resistance[:, structure.second])
+    edge = 1.0 / cell_resistance
+    source = edge * structure.source
+    sink = edge * structure.sink
+    # The Laplacian, a row of cells at a time: diagonal[y] couples the cells
+    # of row y, upper[y] row y to row y + 1
+    diagonal = np.zeros((count, n, n, n))
+    upper = np.zeros((count, max(n - 1, 0), n, n))
+    rows, columns = np.divmod(np.arange(n*n), n)
+    diagonal[:, rows, columns, columns] = pair @ structure.incidence + source + sink
+    y, x1, x2 = structure.row_index
+    diagonal[:, y, x1, x2] = -pair[:, structure.row_pairs]
+    diagonal[:, y, x2, x1] = -pair[:, structure.row_pairs]
+    y, x1, x2 = structure.next_index
+    upper[:, y, x1, x2] = -pair[:, structure.next_pairs]
+    voltages = block_solve(diagonal, upper, source.reshape(count, n, n))
+    # The current leaving the first row edge, at 1 volt
+    current = (source * (1.0 - voltages.reshape(count, n*n))).sum(axis=1)
+    return 1.0 / current
+
+def block_solve(diagonal, upper, rhs):
+    # Solves a stack of symmetric block tridiagonal systems, one block row
+    # per board row, with block Gaussian elimination: n solves of n x n
+    # blocks for the whole stack instead of one n^2 x n^2 solve per board.
+    # Row y is left as x[y] = values[y] - coupling[y] x[y+1]
+    n = rhs.shape[1]
+    coupling = [None] * n
+    values = [None] * n
+    for y in range(n):
+        block = diagonal[:, y]
+        right = rhs[:, y, :, None]
+        if y > 0:
+            lower = np.swapaxes(upper[:, y - 1], 1, 2)
+            block = block - lower @ coupling[y - 1]
+            right = right - lower @ values[y - 1]
+        if y < n - 1:
+            solved = np.linalg.solve(block, np.concatenate((upper[:, y], right), axis=2))
+            coupling[y] = solved[:, :, :n]
+            values[y] = solved[:, :, n:]
+        else:
+            values[y] = np.linalg.solve(block, right)
+    solution = np.empty(rhs.shape)
+    solution[:, n - 1] = values[n - 1][:, :, 0]
+    for y in range(n - 2, -1, -1):
+        solution[:, y] = (values[y] - coupling[y] @ solution[:, y + 1, :, None])[:, :, 0]
+    return solution
+
+def evaluate_boards(boards):
+    # log(white resistance / black resistance) of every board in a stack
+    return np.log(resistances(boards, patterns.WHITE) / resistances(boards, patterns.BLACK))
+
+def evaluate(board):
+    # The value of a HexBoard's position, positive when black is ahead
+    return float(evaluate_boards(np.asarray(board.board_array)[None])[0])
+
+class ResistanceEvaluator():
+    # Picks moves by the value of the position after each of them
+    def move_values(self, board, color=patterns.BLACK):
+        # The empty cells as x,y and the value for color after playing each
+        moves = list(board.unoccupied)
+        start = np.asarray(board.board_array)
+        boards = np.repeat(start[None], len(moves), axis=0)
+        xs = np.array([move[0] for move in moves], dtype=np.intp)
+        ys = np.array([move[1] for move in moves], dtype=np.intp)
+        boards[np.arange(len(moves)), ys, xs] = color
+        values = evaluate_boards(boards)
+        return moves, values if color == patterns.BLACK else -values
+
+    def ranked_moves(self, board, color=patterns.BLACK):
+        # The empty cells, best for color first
+        moves, values = self.move_values(board, color)
+        return [moves[i] for i in np.argsort(-values, kind='stable')]
+
+    def choose(self, board, color=patterns.BLACK):
+        moves, values = self.move_values(board, color)
+        return moves[int(np.argmax(values))]
@@ -0,0 +1,153 @@
+# Self-play
+#
+# Plays whole games against HexBoard without a person at the keyboard. Black
+# is always the board's own pattern player, white is one of the players below.
+# A player only has to provide choose(board), returning the x,y of an empty
+# cell, so scripted games, random games and stronger opponents all go through
+# the same play_game loop.
+#
+# The engines black can play with on top of its patterns are options, a dict
+# from the names in PLAYER_OPTIONS to their settings. configure_board sets
+# them up on a board and add_player_arguments gives the matching command line
+# flags, so the tournament, benchmark and analysis take the same options.
+
+import random
+import book
+import coords
+import hsearch
+import mcts
+import patterns
+import resistance
+import tables
+
+class RandomPlayer():
+    # Plays a uniformly random empty cell, seeded so games can be replayed
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def choose(self, board):
+        return self.rng.choice(board.unoccupied)
+
+class ScriptedPlayer():
+    # Plays a fixed list of moves (positions such as 'c5' or x,y tuples),
+    # skipping any cell that is already taken. Once the script runs out the
+    # fallback player takes over
+    def __init__(self, moves, fallback=None):
+        self.moves = [coords.pos_2_coord(move) if type(move) == str else tuple(move) for move in moves]
+        self.next_move = 0
+        self.fallback = fallback if fallback is not None else RandomPlayer(0)
+
+    def choose(self, board):
+        while self.next_move < len(self.moves):
+            move = self.moves[self.next_move]
+            self.next_move += 1
+            if move in board.cell_masks and board.get_state(move[0], move[1]) == patterns.UNOCCUPIED:
+                return move
+        return self.fallback.choose(board)
+
+class AdversarialPlayer():
+    # Attacks black's patterns: plays the empty cell used by the most live
+    # substrategies, or a random cell when black has none left
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def choose(self, board):
+        cell_index = board.substrategies.cell_index
+        if not cell_index:
+            return self.rng.choice(board.unoccupied)
+        most = max(len(using) for using in cell_index.values())
+        targets = sorted(cell for cell, using in cell_index.items() if len(using) == most)
+        return patterns.index_2_coord(self.rng.choice(targets), board.board_dimension)
+
+class MCTSPlayer():
+    # Plays the move a Monte Carlo tree search finds for white, see mcts.py
+    def __init__(self, seed=None, playouts=200):
+        self.search = mcts.MCTS(playouts=playouts, seed=seed)
+
+    def choose(self, board):
+        return self.search.choose(board, patterns.WHITE)
+
+# White players by name, each is built from a seed
+PLAYERS = {
+    'random': RandomPlayer,
+    'adversarial': AdversarialPlayer,
+    'mcts': MCTSPlayer,
+}
+
+# Black's engine options, in the order they appear in player names
+PLAYER_OPTIONS = ('mcts', 'hsearch', 'resistance', 'book', 'tables')
+
+def add_player_arguments(parser):
+    # Adds a command line flag for every option in PLAYER_OPTIONS
+    parser.add_argument('--mcts', type=int, default=0, metavar='PLAYOUTS',
+                        help="let black search with this many playouts instead of random fallback moves")
+    parser.add_argument('--hsearch', action='store_true', help="let black play virtual connections from hsearch.py")
+    parser.add_argument('--resistance', action='store_true',
+                        help="let black rank its fallback moves with resistance.py")
+    parser.add_argument('--book', action='store_true', help="let black open from the shipped books, see book.py")
+    parser.add_argument('--tables', action='store_true',
+                        help="let black play from the shipped solved tables, see tables.py")
+
+def player_options(args):
+    # The options of parsed command line arguments
+    return {name: getattr(args, name) for name in PLAYER_OPTIONS}
+
+def configure_board(board, options, seed=None):
+    # Sets black's engines up on a HexBoard. With mcts black searches with
+    # that many playouts, seeded with seed, instead of playing random
+    # fallback moves, with resistance it plays the best move by
+    # resistance.py instead, with hsearch it also plays the connections
+    # hsearch.py finds, with book it opens from the shipped book for the
+    # board size and with tables it plays from the shipped solved table.
+    # Returns the board
+    options = options or {}
+    if options.get('mcts'):
+        board.mcts = mcts.MCTS(playouts=options['mcts'], seed=seed)
+    if options.get('resistance'):
+        board.evaluator = resistance.ResistanceEvaluator()
+    if options.get('hsearch'):
+        hsearch.attach(board)
+    if options.get('book'):
+        board.book = book.default_book(board.board_dimension)
+    if options.get('tables'):
+        board.tables = tables.default_table(board.board_dimension)
+    return board
+
+def player_name(options):
+    # Name of the black player in game records, the pattern player and the
+    # options it plays with
+    options = options or {}
+    name = 'patterns'
+    if options.get('mcts'):
+        name += '+mcts%d' % options['mcts']
+    for option in PLAYER_OPTIONS[1:]:
+        if options.get(option):
+            name += '+' + option
+    return name
+
+def default_opening(board_dimension):
+    # Black's first stone, b7 on the 8x8 board main.py plays on
+    return (1, board_dimension - 2)
+
+def place_white(board, x, y):
+    # Plays white's move, black replies inside place_stone
+    board.place_stone(x, y, patterns.WHITE)
+
+def play_game(board_dimension, white, seed=None, opening=None, board=None, play_move=place_white):
+    # Plays one game and returns (winner, board). seed seeds the random module
+    # the pattern player uses for its fallback moves. play_move is called with
+    # (board, x, y) for every white move, the benchmark swaps it for one that
+    # times the reply
+    if seed is not None:
+        random.seed(seed)
+    if board is None:
+        board = patterns.HexBoard(board_dimension)
+    if opening is None:
+        opening = board.book_move() or default_opening(board_dimension)
+    board.place_stone(opening[0], opening[1], patterns.BLACK)
+    board.find_substrategies()
+
+    while board.detect_win() == 0:
+        x, y = white.choose(board)
+        play_move(board, x, y)
+    return board.detect_win(), board
@@ -0,0 +1,151 @@
+# Board symmetries
+#
+# A Hex position looks the same to the players after
+#   ROTATE - turning the board 180 degrees, (x,y) -> (n-1-x, n-1-y)
+#   SWAP   - mirroring it in the main diagonal, (x,y) -> (y,x), which puts
+#            black's stones on white's edges, so the colours and the side to
+#            move swap as well
+# and after both together. The four transforms form a group in which every
+# transform is its own inverse, so the same transform maps a position to its
+# canonical form and a move found there back.
+#
+# canonical picks the smallest of the four forms of a position, so every
+# table keyed on canonical positions stores one entry per class of equivalent
+# positions. A reply stored with the canonical position is mapped back with
+# transform_cell or transform_move and the transform canonical returned.
+#
+# Transforming a bitboard goes through one table of 256 masks per byte of the
+# board, built once per board size by get_symmetry.
+
+import geometry
+import patterns
+
+IDENTITY = 0
+ROTATE = 1
+SWAP = 2
+ROTATE_SWAP = 3
+TRANSFORMS = (IDENTITY, ROTATE, SWAP, ROTATE_SWAP)
+
+class Symmetry():
+    def __init__(self, board_dimension):
+        n = board_dimension
+        self.board_dimension = n
+        self.geometry = geometry.get_geometry(n)
+        cell_count = n*n
+        # The cell each cell goes to, per transform
+        self.cells = (
+            tuple(range(cell_count)),
+            tuple(cell_count - 1 - index for index in range(cell_count)),
+            tuple((index % n)*n + index // n for index in range(cell_count)),
+            tuple(cell_count - 1 - ((index % n)*n + index // n) for index in range(cell_count)),
+        )
+        # Per transform and byte of the board, the mask each byte value
+        # turns into
+        self.byte_tables = []
+        for cells in self.cells:
+            tables = []
+            for start in range(0, cell_count, 8):
+                table = [0] * 256
+                for value in range(1, 256):
+                    low = value & -value
+                    bit = low.bit_length() - 1
+                    if start + bit < cell_count:
+                        table[value] = table[value ^ low] | 1 << cells[start + bit]
+                    else:
+                        table[value] = table[value ^ low]
+                tables.append(table)
+            self.byte_tables.append(tables)
+
+    def transform_bits(self, bits, transform):
+        # The bitboard bits after transform
+        if transform == IDENTITY:
+            return bits
+        result = 0
+        for table in self.byte_tables[transform]:
+            if not bits:
+                break
+            result |= table[bits & 255]
+            bits >>= 8
+        return result
+
+    def transform_cell(self, index, transform):
+        # The index of a cell after transform
+        return self.cells[transform][index]
+
+    def transform_move(self, move, transform):
+        # An x,y move after transform
+        index = self.cells[transform][move[1]*self.board_dimension + move[0]]
+        return patterns.index_2_coord(index, self.board_dimension)
+
+    def transform_record(self, record, transform):
+        # A Substrategy after transform, its cells in the same order. A
+        # transform that swaps the colours turns black's pattern into the
+        # same pattern for white
+        cells = self.cells[transform]
+        return patterns.Substrategy(record.pattern_id, tuple(cells[cell] for cell in record.cells))
+
+    def transform_position(self, black, white, to_move, transform):
+        # (black, white, to_move) after transform
+        black = self.transform_bits(black, transform)
+        white = self.transform_bits(white, transform)
+        if swaps_colours(transform):
+            return white, black, other_colour(to_move)
+        return black, white, to_move
+
+    def canonical(self, black, white, to_move):
+        # The smallest of the four forms of a position and the transform that
+        # gives it, as ((black, white, to_move), transform)
+        best = ((to_move, black, white), IDENTITY)
+        for transform in (ROTATE, SWAP, ROTATE_SWAP):
+            black2, white2, to_move2 = self.transform_position(black, white, to_move, transform)
+            key = (to_move2, black2, white2)
+            if key < best[0]:
+                best = (key, transform)
+        (to_move, black, white), transform = best
+        return (black, white, to_move), transform
+
+    def position_hash(self, black, white, to_move):
+        # Zobrist hash of a position, the same as HexBoard.hash
+        black_keys = self.geometry.black_keys
+        white_keys = self.geometry.white_keys
+        value = 0
+        for index in patterns.mask_indices(black):
+            value ^= black_keys[index]
+        for index in patterns.mask_indices(white):
+            value ^= white_keys[index]
+        if to_move == patterns.WHITE:
+            value ^= self.geometry.white_to_move_key
+        return value
+
+    def canonical_hash(self, black, white, to_move):
+        # Zobrist hash of the canonical form of a position and the transform
+        # that gives it
+        (black, white, to_move), transform = self.canonical(black, white, to_move)
+        return self.position_hash(black, white, to_move), transform
+
+def swaps_colours(transform):
+    return transform == SWAP or transform == ROTATE_SWAP
+
+def other_colour(color):
+    return patterns.WHITE if color == patterns.BLACK else patterns.BLACK
+
+# Symmetry tables by board size
+symmetries = {}
+
+def get_symmetry(board_dimension):
+    symmetry = symmetries.get(board_dimension)
+    if symmetry is None:
+        symmetry = symmetries[board_dimension] = Symmetry(board_dimension)
+    return symmetry
+
+def canonical_position(board):
+    # The canonical form of a HexBoard's position and the transform that
+    # gives it, see Symmetry.canonical
+    symmetry = get_symmetry(board.board_dimension)
+    return symmetry.canonical(board.black_bits, board.white_bits, board.to_move)
+
+def canonical_hash(board):
+    # Zobrist hash of the canonical form of a HexBoard's position and the
+    # transform that gives it
+    symmetry = get_symmetry(board.board_dimension)
+    return symmetry.canonical_hash(board.black_bits, board.white_bits, board.to_move)
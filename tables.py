@@ -0,0 +1,226 @@
+# Solved tables
+#
+# Perfect play on the small boards: for 3x3 and 4x4, and 5x5 given the time,
+# the move to play in every position black can face while it keeps to the
+# table, whether black opened or white did. Each position is solved with
+# verify.Solver. Where the side to move wins the table holds a winning move.
+# Where it loses it holds a move inside the cells the opponent's win depends
+# on, so white's later mistakes still lead to positions in the table.
+#
+# Tables use the book format (see book.py) with their own magic, a table
+# hashed with other Zobrist keys is refused like a book. An entry's cell has
+# WIN_FLAG set when the move wins.
+#
+# The builder works through a queue of canonical positions, solving them over
+# a process pool. Every opponent answer to a solved position's move that
+# doesn't end the game is added to the queue. Every CHECKPOINT_SECONDS the
+# entries so far and the rest of the queue are written to a checkpoint next
+# to the table. An interrupted build carries on from its
+# checkpoint when it is run again. On 5x5 the walk reaches well over half a
+# million positions even with --black-opens, only the 3x3 and 4x4 tables are
+# shipped.
+#
+# A HexBoard uses a table once one is set as its tables, see
+# HexBoard.book_move.
+#
+# Example: python tables.py --sizes 3 4
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import book
+import patterns
+import symmetry
+import verify
+
+MAGIC = b'HEXTABL\0'
+# Set in an entry's cell when the move wins
+WIN_FLAG = 0x8000
+# Positions sent to the process pool at a time
+CHUNK_POSITIONS = 2000
+# Seconds between checkpoints
+CHECKPOINT_SECONDS = 60
+
+class Table():
+    def __init__(self, path):
+        self.book = book.Book(path, MAGIC)
+        self.board_dimension = self.book.board_dimension
+        self.symmetry = self.book.symmetry
+
+    def result(self, board):
+        # (won, x,y) for the side to move on board, won is True when the move
+        # wins with perfect play. None when the position isn't in the table
+        found = self.book.find_position(board)
+        if found is None:
+            return None
+        value, transform = found
+        cell = self.symmetry.transform_cell(value & ~WIN_FLAG, transform)
+        if not board.empty_bits >> cell & 1:
+            # A hash collision with a position that isn't in the table
+            return None
+        return value & WIN_FLAG != 0, patterns.index_2_coord(cell, self.board_dimension)
+
+    def lookup(self, board):
+        # The table's move for the side to move on board as x,y, or None
+        result = self.result(board)
+        if result is None:
+            return None
+        return result[1]
+
+    def __len__(self):
+        return len(self.book)
+
+# Tables already opened in this process, by path
+open_tables = {}
+
+def table_path(board_dimension):
+    return os.path.join(book.BOOK_DIRECTORY, 'table%d.bin' % board_dimension)
+
+def default_table(board_dimension):
+    # The shipped table for a board size, or None if there is none
+    path = table_path(board_dimension)
+    if not os.path.exists(path):
+        return None
+    table = open_tables.get(path)
+    if table is None:
+        table = open_tables[path] = Table(path)
+    return table
+
+def solve_task(task):
+    # Solves one position in a worker process, returns (won, cell) for the
+    # side to move
+    board_dimension, black, white, to_move = task
+    solver = verify.get_solver(board_dimension)
+    if to_move == patterns.BLACK:
+        won, move, carrier = solver.wins(black, white, patterns.BLACK)
+    else:
+        won, move, carrier = solver.wins(white, black, patterns.WHITE)
+    if move is None:
+        # A lost position, hold out inside the opponent's carrier
+        empty = solver.geometry.full_mask & ~(black | white)
+        cells = carrier & empty or empty
+        move = next(index for index in solver.order if cells >> index & 1)
+    return won, move
+
+def start_positions(board_dimension, white_openings=True):
+    # The empty board and every white opening, black to move
+    positions = [(0, 0, patterns.BLACK)]
+    if not white_openings:
+        return positions
+    for index in range(board_dimension * board_dimension):
+        positions.append((0, 1 << index, patterns.BLACK))
+    return positions
+
+def load_checkpoint(path):
+    # (entries, queue) from a checkpoint file
+    with open(path) as f:
+        state = json.load(f)
+    entries = {key: value for key, value in state['entries']}
+    queue = [tuple(position) for position in state['queue']]
+    return entries, queue
+
+def write_checkpoint(path, board_dimension, entries, queue):
+    # Written to a temporary file first, so a build stopped while writing
+    # keeps its previous checkpoint
+    state = {
+        'board_dimension': board_dimension,
+        'entries': sorted(entries.items()),
+        'queue': queue,
+    }
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+def build(board_dimension, path=None, workers=None, white_openings=True, checkpoint_seconds=CHECKPOINT_SECONDS,
+          progress=None):
+    # Builds the table for a board size and writes it to path, by default
+    # the shipped table. Without white_openings it only covers the games
+    # black opens. Returns the number of entries
+    n = board_dimension
+    if path is None:
+        path = table_path(n)
+    checkpoint = path + '.checkpoint'
+    sym = symmetry.get_symmetry(n)
+    solver = verify.get_solver(n)
+
+    if os.path.exists(checkpoint):
+        entries, queue = load_checkpoint(checkpoint)
+        seen = set(entries)
+        seen.update(sym.position_hash(*position) for position in queue)
+    else:
+        entries, queue, seen = {}, [], set()
+        for position in start_positions(n, white_openings):
+            position = sym.canonical(*position)[0]
+            key = sym.position_hash(*position)
+            if key not in seen:
+                seen.add(key)
+                queue.append(position)
+
+    last_checkpoint = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while queue:
+            chunk = queue[:CHUNK_POSITIONS]
+            tasks = [(n,) + position for position in chunk]
+            results = executor.map(solve_task, tasks, chunksize=max(1, len(tasks) // 64))
+            for (black, white, to_move), (won, move) in zip(chunk, results):
+                entries[sym.position_hash(black, white, to_move)] = move | WIN_FLAG if won else move
+                # Every answer to the move that leaves the game open is a
+                # position the table has to cover
+                if to_move == patterns.BLACK:
+                    black |= 1 << move
+                    if solver.connects(black, patterns.BLACK):
+                        continue
+                else:
+                    white |= 1 << move
+                    if solver.connects(white, patterns.WHITE):
+                        continue
+                empty = solver.geometry.full_mask & ~(black | white)
+                for index in patterns.mask_indices(empty):
+                    if to_move == patterns.BLACK:
+                        position = (black, white | 1 << index, to_move)
+                        if solver.connects(position[1], patterns.WHITE):
+                            continue
+                    else:
+                        position = (black | 1 << index, white, to_move)
+                        if solver.connects(position[0], patterns.BLACK):
+                            continue
+                    position = sym.canonical(*position)[0]
+                    key = sym.position_hash(*position)
+                    if key not in seen:
+                        seen.add(key)
+                        queue.append(position)
+            queue = queue[len(chunk):]
+            if queue and time.perf_counter() - last_checkpoint >= checkpoint_seconds:
+                write_checkpoint(checkpoint, n, entries, queue)
+                last_checkpoint = time.perf_counter()
+            if progress is not None:
+                progress(len(entries), len(queue))
+
+    book.write_book(path, n, entries, MAGIC)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return len(entries)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the solved tables for small boards")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3, 4])
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument('--black-opens', action='store_true',
+                        help="only cover the games black opens")
+    args = parser.parse_args(argv)
+
+    def progress(solved, queued):
+        print('  %d solved, %d queued' % (solved, queued), flush=True)
+
+    for board_dimension in args.sizes:
+        path = table_path(board_dimension)
+        if os.path.exists(path + '.checkpoint'):
+            print('resuming %s from its checkpoint' % path)
+        start = time.perf_counter()
+        count = build(board_dimension, path, args.workers, not args.black_opens, progress=progress)
+        print('%d positions written to %s in %.1f s' % (count, path, time.perf_counter() - start))
+
+if __name__ == "__main__":
+    main()
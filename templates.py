@@ -0,0 +1,231 @@
+# Pattern templates
+#
+# Every pattern HexBoard looks for is described here as data instead of code.
+# A template is anchored on a black stone at (x,y) and lists every other cell
+# it needs as an (x,y) offset from that stone:
+#
+#   id       - pattern id stored at the end of a substrategy, get_move uses it
+#              to pick the reply
+#   group    - 'bridge', 'single' or 'adjacent'. Bridges and singles only need
+#              the anchor stone, adjacent patterns need a second black stone
+#              next to it
+#   black    - offsets that must all hold a black stone
+#   any      - offsets where at least one must hold a black stone
+#   white    - offsets that must all hold a white stone
+#   cells    - the empty cells of the pattern, in the order the reply and
+#              decompose functions index them
+#   connect  - indices into cells that must be connected up or down, either
+#              by being on a black edge or by touching a black stone in the
+#              row above or below (see connected_ud_pattern)
+#   edge     - indices into cells that must lie on a black edge
+#
+# A template only exists at an anchor when all of its required cells fit on
+# the board. compile_templates turns the table into per-cell masks once per
+# board size, so matching a template is a handful of mask tests. It also
+# records which templates each cell can affect, so a placement only has to
+# re-match the templates around it.
+#
+# New local patterns can be added as new entries, get_move replies to any id
+# it does not know with reply_two_part.
+
+# Neighbours in clockwise order, consecutive ones are also neighbours of each
+# other. Used to generate the edge bridge entries
+NEIGHBOUR_RING = [(1,0), (1,-1), (0,-1), (-1,0), (-1,1), (0,1)]
+
+PATTERN_TABLE = [
+    # Bridge between two black stones, the two shared neighbours are the
+    # carrier. Only the forward directions are listed so each bridge is found
+    # from one of its stones
+    {'id': 2, 'group': 'bridge', 'black': [(1,1)], 'cells': [(1,0), (0,1)]},
+    {'id': 2, 'group': 'bridge', 'black': [(-1,2)], 'cells': [(-1,1), (0,1)]},
+    {'id': 2, 'group': 'bridge', 'black': [(-2,1)], 'cells': [(-1,0), (-1,1)]},
+] + [
+    # Edge bridge, two neighbouring empty cells on a black edge next to the
+    # stone
+    {'id': 2, 'group': 'bridge', 'cells': [NEIGHBOUR_RING[i], NEIGHBOUR_RING[(i+1) % 6]], 'edge': [0, 1]}
+    for i in range(6)
+] + [
+    # 432 pattern, in the four orientations that reach the top or bottom
+    {'id': 5, 'group': 'single',
+     'cells': [(-1,1), (-2,2), (-1,2), (1,1), (1,0), (0,1), (0,2), (1,2)],
+     'connect': [1, 2, 6, 7]},
+    {'id': 5, 'group': 'single',
+     'cells': [(0,1), (0,2), (-1,2), (-2,1), (-1,0), (-1,1), (-3,2), (-2,2)],
+     'connect': [1, 2, 6, 7]},
+    {'id': 5, 'group': 'single',
+     'cells': [(0,-1), (0,-2), (1,-2), (2,-1), (1,0), (1,-1), (2,-2), (3,-2)],
+     'connect': [1, 2, 6, 7]},
+    {'id': 5, 'group': 'single',
+     'cells': [(1,-1), (1,-2), (2,-2), (-1,-1), (-1,0), (0,-1), (-1,-2), (0,-2)],
+     'connect': [1, 2, 6, 7]},
+
+    # 9th Jing Yang pattern, down and up
+    {'id': 9, 'group': 'single', 'white': [(-1,2)],
+     'cells': [(-2,1), (-1,0), (-1,1), (-3,2), (-2,2), (1,1), (1,0), (0,1), (0,2), (1,2)],
+     'connect': [3, 4, 8, 9]},
+    {'id': 9, 'group': 'single', 'white': [(1,-2)],
+     'cells': [(-1,-1), (-1,0), (0,-1), (0,-2), (-1,-2), (2,-1), (1,0), (1,-1), (2,-2), (3,-2)],
+     'connect': [3, 4, 8, 9]},
+
+    # Double triangle (6th Jing Yang pattern), the anchor is the left stone of
+    # the pair
+    {'id': 6, 'group': 'adjacent', 'black': [(1,0)],
+     'cells': [(-1,2), (-1,1), (0,1), (1,1), (0,2), (1,2)],
+     'connect': [0, 1, 2, 3, 4, 5]},
+    {'id': 6, 'group': 'adjacent', 'black': [(1,0)],
+     'cells': [(2,-2), (2,-1), (1,-1), (0,-1), (1,-2), (0,-2)],
+     'connect': [0, 1, 2, 3, 4, 5]},
+
+    # 3rd Jing Yang pattern, down and up
+    {'id': 3, 'group': 'adjacent', 'any': [(-1,0), (1,0)], 'white': [(0,1)],
+     'cells': [(-1,1), (-2,2), (-1,2), (1,1), (0,2), (1,2)],
+     'connect': [0, 1, 2, 3, 4, 5]},
+    {'id': 3, 'group': 'adjacent', 'any': [(-1,0), (1,0)], 'white': [(1,-1)],
+     'cells': [(0,-1), (0,-2), (1,-2), (2,-1), (2,-2), (3,-2)],
+     'connect': [0, 1, 2, 3, 4, 5]},
+
+    # 4th Jing Yang pattern, down-right, down-left, up-left and up-right
+    {'id': 4, 'group': 'adjacent', 'any': [(-1,0), (1,0)], 'white': [(0,2)],
+     'cells': [(-1,2), (-1,1), (0,1), (2,1), (2,0), (1,1), (1,2), (2,2)],
+     'connect': [0, 6, 7]},
+    {'id': 4, 'group': 'adjacent', 'any': [(-1,0), (1,0)], 'white': [(-1,2)],
+     'cells': [(0,2), (1,1), (0,1), (-2,1), (-1,0), (-1,1), (-3,2), (-2,2)],
+     'connect': [0, 6, 7]},
+    {'id': 4, 'group': 'adjacent', 'any': [(-1,0), (1,0)], 'white': [(1,-2)],
+     'cells': [(2,-2), (2,-1), (1,-1), (-1,-1), (-1,0), (0,-1), (0,-2), (-1,-2)],
+     'connect': [0, 6, 7]},
+    {'id': 4, 'group': 'adjacent', 'any': [(-1,0), (1,0)], 'white': [(2,-2)],
+     'cells': [(1,-2), (0,-1), (1,-1), (3,-1), (2,0), (2,-1), (3,-2), (4,-2)],
+     'connect': [0, 6, 7]},
+
+    # Pattern 7 (Local Pattern 5 in the Hayward document), down-right and
+    # up-left with a diagonal pair, up-right and down-left with a vertical pair
+    {'id': 7, 'group': 'adjacent', 'any': [(1,-1), (-1,1)], 'white': [(-1,2)],
+     'cells': [(-2,2), (-3,3), (-2,3), (1,1), (1,0), (0,1), (0,2), (-1,3), (0,3), (2,2),
+               (2,1), (1,2), (1,3), (2,3)],
+     'connect': [1, 2, 7, 8, 12, 13]},
+    {'id': 7, 'group': 'adjacent', 'any': [(1,-1), (-1,1)], 'white': [(1,-2)],
+     'cells': [(2,-2), (3,-3), (2,-3), (-1,-1), (-1,0), (0,-1), (0,-2), (1,-3), (0,-3), (-2,-2),
+               (-2,-1), (-1,-2), (-1,-3), (-2,-3)],
+     'connect': [1, 2, 7, 8, 12, 13]},
+    {'id': 7, 'group': 'adjacent', 'any': [(0,-1), (0,1)], 'white': [(1,-2)],
+     'cells': [(0,-2), (0,-3), (1,-3), (2,-1), (1,0), (1,-1), (2,-2), (2,-3), (3,-3), (4,-2),
+               (3,-1), (3,-2), (4,-3), (5,-3)],
+     'connect': [1, 2, 7, 8, 12, 13]},
+    {'id': 7, 'group': 'adjacent', 'any': [(0,-1), (0,1)], 'white': [(-1,2)],
+     'cells': [(0,2), (0,3), (-1,3), (-2,1), (-1,0), (-1,1), (-2,2), (-2,3), (-3,3), (-4,2),
+               (-3,1), (-3,2), (-4,3), (-5,3)],
+     'connect': [1, 2, 7, 8, 12, 13]},
+
+    # Pattern 8 (Local Pattern 4 in the Hayward document)
+    {'id': 8, 'group': 'adjacent', 'any': [(1,-1), (-1,1)], 'white': [(-2,2)],
+     'cells': [(1,0), (0,1), (1,1), (2,1), (-1,2), (0,2), (1,2), (2,2), (-2,3),
+               (-1,3), (0,3), (1,3), (2,3)],
+     'connect': [8, 9, 10, 11, 12]},
+    {'id': 8, 'group': 'adjacent', 'any': [(1,-1), (-1,1)], 'white': [(2,-2)],
+     'cells': [(-1,0), (0,-1), (-1,-1), (-2,-1), (1,-2), (0,-2), (-1,-2), (-2,-2), (2,-3),
+               (1,-3), (0,-3), (-1,-3), (-2,-3)],
+     'connect': [8, 9, 10, 11, 12]},
+    {'id': 8, 'group': 'adjacent', 'any': [(0,-1), (0,1)], 'white': [(0,2)],
+     'cells': [(-1,0), (-1,1), (-2,1), (-3,1), (-1,2), (-2,2), (-3,2), (-4,2), (-1,3),
+               (-2,3), (-3,3), (-4,3), (-5,3)],
+     'connect': [8, 9, 10, 11, 12]},
+    {'id': 8, 'group': 'adjacent', 'any': [(0,-1), (0,1)], 'white': [(0,-2)],
+     'cells': [(1,0), (1,-1), (2,-1), (3,-1), (1,-2), (2,-2), (3,-2), (4,-2), (1,-3),
+               (2,-3), (3,-3), (4,-3), (5,-3)],
+     'connect': [8, 9, 10, 11, 12]},
+
+    # Pattern 12 (Local Pattern 7 in the Hayward document), needs no white
+    # stone
+    {'id': 12, 'group': 'adjacent', 'any': [(1,-1), (-1,1)],
+     'cells': [(1,0), (0,1), (1,1), (-2,2), (-1,2), (0,2), (1,2), (-3,3), (-2,3), (-1,3),
+               (0,3), (1,3), (-4,4), (-3,4), (-2,4), (-1,4), (0,4), (1,4)],
+     'connect': [12, 13, 14, 15, 16, 17]},
+    {'id': 12, 'group': 'adjacent', 'any': [(1,-1), (-1,1)],
+     'cells': [(-1,0), (0,-1), (-1,-1), (2,-2), (1,-2), (0,-2), (-1,-2), (3,-3), (2,-3), (1,-3),
+               (0,-3), (-1,-3), (4,-4), (3,-4), (2,-4), (1,-4), (0,-4), (-1,-4)],
+     'connect': [12, 13, 14, 15, 16, 17]},
+    {'id': 12, 'group': 'adjacent', 'any': [(0,-1), (0,1)],
+     'cells': [(-1,0), (-1,1), (-2,1), (0,2), (-1,2), (-2,2), (-3,2), (0,3), (-1,3), (-2,3),
+               (-3,3), (-4,3), (0,4), (-1,4), (-2,4), (-3,4), (-4,4), (-5,4)],
+     'connect': [12, 13, 14, 15, 16, 17]},
+    {'id': 12, 'group': 'adjacent', 'any': [(0,-1), (0,1)],
+     'cells': [(1,0), (1,-1), (2,-1), (0,-2), (1,-2), (2,-2), (3,-2), (0,-3), (1,-3), (2,-3),
+               (3,-3), (4,-3), (0,-4), (1,-4), (2,-4), (3,-4), (4,-4), (5,-4)],
+     'connect': [12, 13, 14, 15, 16, 17]},
+]
+
+# Compiled tables, one per board size
+compiled_tables = {}
+
+def compile_templates(board_dimension):
+    # Returns the pattern table compiled for the given board size. The result
+    # maps each group to a list indexed by anchor cell (y*n + x), holding one
+    # tuple per template that fits at that anchor:
+    #   (pattern id, cell indices, cells mask, black mask, any mask,
+    #    white mask, connect mask)
+    # 'dependents' maps each cell to the (group, anchor, position) of every
+    # compiled template whose match can change when that cell is played, and
+    # 'footprints' holds, per anchor, the mask of every cell the matches of
+    # any template anchored there depend on
+    if board_dimension in compiled_tables:
+        return compiled_tables[board_dimension]
+
+    n = board_dimension
+    def on_board(x, y):
+        return 0 <= x < n and 0 <= y < n
+
+    compiled = {'bridge': [], 'single': [], 'adjacent': []}
+    for group in compiled:
+        compiled[group] = [[] for index in range(n*n)]
+    dependents = [[] for index in range(n*n)]
+    footprints = [1 << index for index in range(n*n)]
+
+    for y in range(n):
+        for x in range(n):
+            anchor = y*n + x
+            for template in PATTERN_TABLE:
+                required = template['cells'] + template.get('black', []) + template.get('white', [])
+                if not all(on_board(x+dx, y+dy) for dx, dy in required):
+                    continue
+                cells = tuple((y+dy)*n + (x+dx) for dx, dy in template['cells'])
+                edge_cells = [cells[i] for i in template.get('edge', [])]
+                if not all(cell // n == 0 or cell // n == n-1 for cell in edge_cells):
+                    continue
+
+                any_cells = [(x+dx, y+dy) for dx, dy in template.get('any', []) if on_board(x+dx, y+dy)]
+                if template.get('any') and not any_cells:
+                    continue
+                anchor_list = compiled[template['group']][anchor]
+                anchor_list.append((
+                    template['id'],
+                    cells,
+                    offsets_to_mask(x, y, n, template['cells']),
+                    offsets_to_mask(x, y, n, template.get('black', [])),
+                    offsets_to_mask(0, 0, n, any_cells),
+                    offsets_to_mask(x, y, n, template.get('white', [])),
+                    sum(1 << cells[i] for i in template.get('connect', []))))
+
+                # The match depends on the anchor, every required cell and the
+                # cells above and below the ones that must connect
+                footprint = [(x, y)] + any_cells + [(x+dx, y+dy) for dx, dy in required]
+                for i in template.get('connect', []):
+                    cx, cy = template['cells'][i]
+                    for dx, dy in [(0,-1), (1,-1), (0,1), (-1,1)]:
+                        if on_board(x+cx+dx, y+cy+dy):
+                            footprint.append((x+cx+dx, y+cy+dy))
+                for cell in set(footprint):
+                    dependents[cell[1]*n + cell[0]].append((template['group'], anchor, len(anchor_list)-1))
+                    footprints[anchor] |= 1 << (cell[1]*n + cell[0])
+
+    compiled['dependents'] = dependents
+    compiled['footprints'] = footprints
+    compiled_tables[board_dimension] = compiled
+    return compiled
+
+def offsets_to_mask(x, y, board_dimension, offsets):
+    # Converts offsets from (x,y) into a mask of cell bits
+    mask = 0
+    for dx, dy in offsets:
+        mask |= 1 << ((y+dy)*board_dimension + (x+dx))
+    return mask
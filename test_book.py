@@ -0,0 +1,37 @@
+# Opening book and solved table files
+#
+# Run with: python -m pytest -q test_book.py
+
+import pytest
+import book
+import patterns
+import symmetry
+import tables
+
+def test_book_round_trip(tmp_path):
+    path = str(tmp_path / 'book.bin')
+    board = patterns.HexBoard(5)
+    key, transform = symmetry.get_symmetry(5).canonical_hash(board.black_bits, board.white_bits, board.to_move)
+    book.write_book(path, 5, {key: 12})
+    opened = book.Book(path)
+    assert len(opened) == 1
+    assert opened.lookup(board) == (2, 2)
+    opened.close()
+
+def test_other_zobrist_keys_are_refused(tmp_path):
+    path = str(tmp_path / 'book.bin')
+    digest = symmetry.get_symmetry(5).geometry.zobrist_digest
+    with open(path, 'wb') as f:
+        f.write(book.HEADER.pack(book.MAGIC, book.VERSION, 5, 0, digest ^ 1))
+    with pytest.raises(ValueError):
+        book.Book(path)
+    with open(path, 'wb') as f:
+        f.write(book.HEADER.pack(tables.MAGIC, book.VERSION, 5, 0, digest ^ 1))
+    with pytest.raises(ValueError):
+        tables.Table(path)
+
+def test_shipped_files_open():
+    for n in range(5, 12):
+        assert len(book.default_book(n)) > 0
+    for n in (3, 4):
+        assert len(tables.default_table(n)) > 0
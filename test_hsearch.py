@@ -0,0 +1,38 @@
+# Replies to white stones in the virtual connections of hsearch.py
+#
+# Run with: python -m pytest -q test_hsearch.py
+
+import pytest
+import hsearch
+import patterns
+
+def position(n, stones):
+    # An HSearch for black stones at the x,y in stones
+    search = hsearch.HSearch(n)
+    search.compute(sum(1 << y*n + x for x, y in stones), 0)
+    return search
+
+def test_reply_tries_every_pair_of_a_carrier():
+    n = 5
+    search = position(n, [(1, 1), (2, 3)])
+    record = search.substrategies()[0]
+    white_move = record.cells[0]
+    expected = search.copy()
+    expected.play(white_move, patterns.WHITE)
+    expected = expected.reply(record, white_move)
+
+    # Two far apart empty cells have no SC, a pair of them under the same
+    # carrier can't answer, before or after the real pair
+    stale = (0, n*n - 1)
+    carrier = sum(1 << cell for cell in record.cells)
+    for pairs in ([stale] + search.records[carrier], search.records[carrier] + [stale]):
+        other = search.copy()
+        other.records[carrier] = list(pairs)
+        other.play(white_move, patterns.WHITE)
+        assert other.reply(record, white_move) == expected
+
+    other = search.copy()
+    other.records[carrier] = [stale]
+    other.play(white_move, patterns.WHITE)
+    with pytest.raises(ValueError):
+        other.reply(record, white_move)
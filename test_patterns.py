@@ -0,0 +1,141 @@
+# Randomised checks of the incremental board structures against plain
+# recomputation from the stones
+#
+# Run with: python -m pytest -q test_patterns.py
+
+import random
+from collections import Counter
+import pytest
+import patterncache
+import patterns
+
+SIZES = (2, 3, 5, 8, 11)
+
+def connects(board, color):
+    # Reference win check, a flood fill over board_array from the first row
+    # (black) or column (white) through neighbouring cells of color
+    n = board.board_dimension
+    neighbours = board.geometry.neighbour_coords
+    if color == patterns.BLACK:
+        frontier = [(x, 0) for x in range(n) if board.board_array[0][x] == color]
+    else:
+        frontier = [(0, y) for y in range(n) if board.board_array[y][0] == color]
+    seen = set(frontier)
+    while frontier:
+        x, y = frontier.pop()
+        if (color == patterns.BLACK and y == n - 1) or (color == patterns.WHITE and x == n - 1):
+            return True
+        for nx, ny in neighbours[y*n + x]:
+            if (nx, ny) not in seen and board.board_array[ny][nx] == color:
+                seen.add((nx, ny))
+                frontier.append((nx, ny))
+    return False
+
+def random_stones(board, rng):
+    # Yields after every stone of a random fill of the whole board, the
+    # colours taking turns
+    cells = list(board.geometry.coords)
+    rng.shuffle(cells)
+    for i, (x, y) in enumerate(cells):
+        board.set_stone(x, y, patterns.BLACK if i % 2 == 0 else patterns.WHITE)
+        yield x, y
+
+def test_detect_win_matches_flood_fill():
+    rng = random.Random(1)
+    for n in SIZES:
+        for game in range(20):
+            board = patterns.HexBoard(n)
+            for x, y in random_stones(board, rng):
+                if connects(board, patterns.BLACK):
+                    expected = patterns.BLACK
+                elif connects(board, patterns.WHITE):
+                    expected = patterns.WHITE
+                else:
+                    expected = patterns.UNOCCUPIED
+                assert board.detect_win() == expected
+
+def test_matches_equal_full_rescan():
+    # The template matches kept up to date stone by stone are the ones a
+    # rescan of every black stone finds
+    rng = random.Random(4)
+    for n in SIZES:
+        for game in range(10):
+            board = patterns.HexBoard(n)
+            for x, y in random_stones(board, rng):
+                rescan = board.find_single_patterns() + board.find_adjacent_patterns()
+                assert Counter(board.matches.values()) == Counter(rescan)
+
+def test_cached_matches_equal_uncached():
+    # Rescans through a small shared cache find the same templates as the
+    # matches kept stone by stone, while entries are hit, evicted and the
+    # cache is resized under them
+    rng = random.Random(14)
+    for policy in ('lru', 'fifo'):
+        cache = patterncache.PatternCache(64, policy)
+        for n in SIZES:
+            for game in range(10):
+                board = patterns.HexBoard(n)
+                board.pattern_cache = cache
+                for i, (x, y) in enumerate(random_stones(board, rng)):
+                    if i == n:
+                        cache.resize(rng.choice((0, 8, 32, 64)))
+                        assert len(cache) <= cache.size
+                    rescan = board.find_single_patterns() + board.find_adjacent_patterns()
+                    assert Counter(board.matches.values()) == Counter(rescan)
+                cache.resize(64)
+        assert cache.hits > 0
+        assert cache.evictions > 0
+        assert len(cache) <= 64
+
+def test_detect_win_batch_matches_detect_win():
+    rng = random.Random(18)
+    for n in SIZES:
+        boards = []
+        expected = []
+        for game in range(30):
+            board = patterns.HexBoard(n)
+            # Partly filled boards as well as full ones
+            stop = rng.randrange(n*n + 1)
+            for i, (x, y) in enumerate(random_stones(board, rng)):
+                if i + 1 == stop:
+                    break
+            boards.append(board.board_array.copy())
+            expected.append(board.detect_win())
+        assert list(patterns.detect_win_batch(boards)) == expected
+
+def test_cell_set_state_keeps_bitboards_apart():
+    board = patterns.HexBoard(3)
+    cell = board.board_dict[(0,0)]
+    cell.set_state(patterns.BLACK)
+    for state in (patterns.UNOCCUPIED, patterns.WHITE, patterns.BLACK):
+        with pytest.raises(ValueError):
+            cell.set_state(state)
+    with pytest.raises(ValueError):
+        board.board_dict[(1,1)].set_state(patterns.UNOCCUPIED)
+    board.board_dict[(1,1)].set_state(patterns.WHITE)
+    assert board.black_bits & board.white_bits == 0
+    assert board.history == [0, 4]
+    assert cell.get_state() == patterns.BLACK
+
+def test_cell_helpers_take_indices():
+    board = patterns.HexBoard(3)
+    board.set_stone(1, 1, patterns.BLACK)
+    assert board.check_all_empty([0, 1, 8])
+    assert not board.check_all_empty([0, 4])
+    assert not board.check_all_empty([9])
+    # Row 0 and row 2 cells next to the stone, and edge cells, are connected
+    assert board.connected_ud_pattern([1, 2, 7])
+    assert not board.connected_ud_pattern([3])
+
+def test_unthreatened_strategy_survives_failed_reply():
+    # A pattern 10 to 17 black picked at random has no reply to a white
+    # stone outside it, it is kept for place_stone's fallback move
+    board = patterns.HexBoard(5)
+    cells = tuple(range(18))
+    for pattern_id in range(10, 18):
+        strat = patterns.Substrategy(pattern_id, cells)
+        board.substrategies.append(strat)
+        with pytest.raises(ValueError):
+            board.get_move(strat, 24)
+        assert strat in board.substrategies
+        board.substrategies.remove(strat)
@@ -0,0 +1,64 @@
+# Game record archives, see records.py
+#
+# Run with: python -m pytest -q test_records.py
+
+import os
+import random
+import patterns
+import records
+
+def random_records(rng, count):
+    # Records of random lengths and sizes, some with moves past 127 so they
+    # take two varint bytes, and non-ASCII names
+    result = []
+    for i in range(count):
+        n = rng.choice((3, 8, 11, 13, 19))
+        moves = rng.sample(range(n*n), rng.randrange(n*n + 1))
+        first = rng.choice((patterns.BLACK, patterns.WHITE))
+        winner = rng.choice((0, patterns.BLACK, patterns.WHITE))
+        result.append(records.GameRecord(n, moves, 'patterns', 'wéiß %d' % i, first, winner))
+    return result
+
+def test_write_read_round_trip(tmp_path):
+    path = str(tmp_path / 'games.bin')
+    games = random_records(random.Random(24), 300)
+    records.append_records(path, games[:100])
+    # Appending to an existing archive keeps what it holds
+    records.append_records(path, games[100:])
+    assert list(records.read_records(path)) == games
+
+def test_blocks_split_records(tmp_path, monkeypatch):
+    # Records that straddle the blocks read_records reads at a time
+    path = str(tmp_path / 'games.bin')
+    games = random_records(random.Random(5), 50)
+    records.append_records(path, games)
+    monkeypatch.setattr(records, 'READ_SIZE', 7)
+    assert list(records.read_records(path)) == games
+
+def test_spans_match_read_records(tmp_path):
+    path = str(tmp_path / 'games.bin')
+    games = random_records(random.Random(7), 200)
+    records.append_records(path, games)
+    spans = list(records.record_spans(path))
+    assert len(spans) == len(games)
+    assert spans[0][0] == records.HEADER.size
+    assert spans[-1][1] == os.path.getsize(path)
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        assert end == next_start
+    for number, (start, end) in enumerate(spans):
+        assert list(records.read_records(path, start, 3)) == games[number:number + 3]
+
+def test_record_cut_mid_way(tmp_path):
+    path = str(tmp_path / 'games.bin')
+    games = random_records(random.Random(9), 20)
+    records.append_records(path, games)
+    spans = list(records.record_spans(path))
+    # Cut inside the last record's length and inside its payload
+    for cut in (spans[-1][0] + 1, spans[-1][1] - 1):
+        with open(path, 'r+b') as f:
+            f.truncate(cut)
+        assert list(records.read_records(path)) == games[:-1]
+        assert list(records.record_spans(path)) == spans[:-1]
+        # The next writer cuts the unfinished record off
+        records.append_records(path, games[-1:])
+        assert list(records.read_records(path)) == games
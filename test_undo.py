@@ -0,0 +1,98 @@
+# HexBoard.play, undo, redo and clone checked against fresh replays of the
+# same games, with virtual connections from hsearch.py attached
+#
+# Run with: python -m pytest -q test_undo.py
+
+import random
+import hsearch
+import patterns
+
+def snapshot(board):
+    # Everything a move changes
+    return (
+        board.black_bits, board.white_bits, board.empty_bits,
+        board.hash, board.to_move,
+        tuple(board.parent), tuple(board.set_size),
+        tuple(board.substrategies.ordered()),
+        tuple(board.unoccupied), tuple(board.history),
+        tuple(map(tuple, board.board_array)),
+        tuple(sorted((carrier, tuple(pairs)) for carrier, pairs in board.hsearch.records.items())),
+    )
+
+def hsearch_replies(board):
+    # Black's reply to a white stone on the first cell of every pattern 18
+    # substrategy, each played on a clone with the same random seed, and
+    # whether the reply came from the connection. reply_counts is a running
+    # tally undo leaves alone, only what the reply adds is compared
+    replies = []
+    counted = board.reply_counts.get(hsearch.HSEARCH_PATTERN, 0)
+    for record in board.substrategies.ordered():
+        if record.pattern_id == hsearch.HSEARCH_PATTERN:
+            x, y = patterns.index_2_coord(record.cells[0], board.board_dimension)
+            reply = board.clone()
+            random.seed(0)
+            reply.place_stone(x, y, patterns.WHITE)
+            replies.append((record, reply.reply_counts.get(hsearch.HSEARCH_PATTERN, 0) - counted, tuple(reply.history)))
+    return replies
+
+def new_game(n, seed):
+    # A board with hsearch attached after black's opening, as play_game sets
+    # it up
+    random.seed(seed)
+    board = patterns.HexBoard(n)
+    hsearch.attach(board)
+    board.place_stone(1, n - 2, patterns.BLACK)
+    board.find_substrategies()
+    return board
+
+def play_game(n, seed):
+    # Plays random white moves with play until the game ends, returns the
+    # board, the white moves and the snapshot after each ply, the root first
+    rng = random.Random(seed)
+    board = new_game(n, seed)
+    moves = []
+    snapshots = [snapshot(board)]
+    while board.detect_win() == 0:
+        x, y = rng.choice(board.unoccupied)
+        assert board.play(x, y, patterns.WHITE)
+        moves.append((x, y))
+        snapshots.append(snapshot(board))
+    return board, moves, snapshots
+
+def replay(n, seed, moves):
+    # A fresh board with moves played on it
+    board = new_game(n, seed)
+    for x, y in moves:
+        board.place_stone(x, y, patterns.WHITE)
+    return board
+
+def test_undo_redo_match_fresh_replay():
+    for n in (4, 5, 8):
+        for seed in range(6):
+            board, moves, snapshots = play_game(n, seed)
+            fresh = [replay(n, seed, moves[:ply]) for ply in range(len(moves) + 1)]
+            for ply in range(len(moves) + 1):
+                assert snapshot(fresh[ply]) == snapshots[ply]
+            for ply in range(len(moves), 0, -1):
+                assert board.undo()
+                assert snapshot(board) == snapshots[ply - 1]
+                # White playing in a virtual connection is answered as on a
+                # board that never took a move back
+                assert hsearch_replies(board) == hsearch_replies(fresh[ply - 1])
+            assert not board.undo()
+            for ply in range(1, len(moves) + 1):
+                assert board.redo()
+                assert snapshot(board) == snapshots[ply]
+                assert hsearch_replies(board) == hsearch_replies(fresh[ply])
+            assert not board.redo()
+
+def test_clone_is_independent():
+    board, moves, snapshots = play_game(8, 1)
+    for ply in range(len(moves) // 2):
+        board.undo()
+    before = snapshot(board)
+    copy = board.clone()
+    assert snapshot(copy) == before
+    x, y = copy.unoccupied[0]
+    copy.place_stone(x, y, patterns.WHITE)
+    assert snapshot(board) == before
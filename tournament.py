@@ -0,0 +1,125 @@
+# Self-play tournament
+#
+# Plays many games of the pattern player (black) against a white player from
+# selfplay.PLAYERS, spread over a process pool. Every game is its own task
+# with a seed worked out from the tournament seed and the game number, so a
+# game replays the same way whichever worker runs it and however many workers
+# there are. The workers send back small result dicts which are merged into
+# win/loss counts and the number of replies made with each pattern id.
+#
+# Example: python tournament.py --games 20000 --sizes 5 8 --player adversarial
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import patterns
+import records
+import selfplay
+
+def game_seed(seed, game_number):
+    # Seed of one game, distinct for every game of every tournament seed
+    return seed * 1000003 + game_number
+
+def play_task(task):
+    # Plays one game in a worker process and returns its result, with the
+    # game's record when record is set
+    game_number, board_dimension, player, seed, options, record = task
+    white = selfplay.PLAYERS[player](seed)
+    board = selfplay.configure_board(patterns.HexBoard(board_dimension), options, seed)
+    winner, board = selfplay.play_game(board_dimension, white, seed=seed, board=board)
+    result = {
+        'game': game_number,
+        'board_dimension': board_dimension,
+        'winner': winner,
+        'stones': board.geometry.cell_count - len(board.unoccupied),
+        'reply_counts': board.reply_counts,
+    }
+    if record:
+        result['record'] = records.record_from_board(board, selfplay.player_name(options), player)
+    return result
+
+def make_tasks(games, sizes, player, seed, options=None, record=False):
+    # One task per game, the board sizes take turns
+    options = options or {}
+    return [(game, sizes[game % len(sizes)], player, game_seed(seed, game), options, record)
+            for game in range(games)]
+
+def merge_results(results):
+    # Totals the game results per board size
+    sizes = {}
+    for result in results:
+        stats = sizes.setdefault(result['board_dimension'], {
+            'games': 0, 'black_wins': 0, 'white_wins': 0, 'stones': 0, 'reply_counts': {}})
+        stats['games'] += 1
+        if result['winner'] == patterns.BLACK:
+            stats['black_wins'] += 1
+        else:
+            stats['white_wins'] += 1
+        stats['stones'] += result['stones']
+        for pattern_id, count in result['reply_counts'].items():
+            stats['reply_counts'][pattern_id] = stats['reply_counts'].get(pattern_id, 0) + count
+    return sizes
+
+def run_tournament(games, sizes, player='random', seed=0, workers=None, chunksize=None, options=None,
+                   record_path=None):
+    # Plays the tournament and returns the merged statistics per board size.
+    # Tasks are sent to the workers in chunks to keep the process overhead
+    # small next to the games themselves. options are black's engines, see
+    # selfplay.configure_board. With record_path every game is appended to
+    # that game record archive, see records.py
+    tasks = make_tasks(games, sizes, player, seed, options, record_path is not None)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(tasks) // (workers * 8))
+    if workers == 1:
+        return merge_results(recorded(map(play_task, tasks), record_path))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge_results(recorded(executor.map(play_task, tasks, chunksize=chunksize), record_path))
+
+def recorded(results, record_path):
+    # Passes the results on, appending their games to record_path if given
+    if record_path is None:
+        yield from results
+        return
+    with records.RecordWriter(record_path) as writer:
+        for result in results:
+            writer.write(result['record'])
+            yield result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a self-play tournament over a process pool")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[8])
+    parser.add_argument('--player', choices=sorted(selfplay.PLAYERS), default='random')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of cores")
+    selfplay.add_player_arguments(parser)
+    parser.add_argument('--record', help="append every game to this game record archive, see records.py")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    sizes = run_tournament(args.games, args.sizes, args.player, args.seed, args.workers,
+                           options=selfplay.player_options(args), record_path=args.record)
+    seconds = time.perf_counter() - start
+
+    for board_dimension, stats in sorted(sizes.items()):
+        print('%dx%d: %d games, black %d white %d (%.1f%% black)'
+              % (board_dimension, board_dimension, stats['games'], stats['black_wins'],
+                 stats['white_wins'], 100 * stats['black_wins'] / stats['games']))
+        counts = ', '.join('%d: %d' % item for item in sorted(stats['reply_counts'].items()))
+        print('    replies by pattern id: ' + counts)
+    print('%d games in %.1f s, %.0f games/s' % (args.games, seconds, args.games / seconds if seconds else 0))
+
+    if args.output:
+        report = {'config': vars(args), 'seconds': seconds,
+                  'results': {str(size): stats for size, stats in sizes.items()}}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return sizes
+
+if __name__ == "__main__":
+    main()
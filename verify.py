@@ -0,0 +1,386 @@
+# Offline verification
+#
+# Two checks that would otherwise only show up as lost games:
+#
+# Patterns - every template in templates.PATTERN_TABLE is put on an empty
+# board with its far row on a black edge, and its substrategy becomes the only
+# live one. White then tries every sequence of moves inside the live
+# substrategies and black answers each move with HexBoard.get_move, exactly as
+# place_stone would. Once no substrategy is left black must have joined the
+# anchor stone to that edge using its own stones only, any cell still empty
+# counts as white. Cells outside the live substrategies are never tried:
+# black's replies only depend on the live substrategies and white's move, so a
+# white stone there can only matter at the end, where it is already assumed.
+# Positions are memoised in a transposition table keyed on the stones and the
+# live substrategies, so each position of a pattern is searched once. The
+# derived ids (10, 11, 13-17) are checked through the patterns that
+# decompose into them.
+#
+# What python verify.py --patterns finds on the 8x8 board, with the templates
+# as they came, not faults of the checker:
+#   - 12 fails at all four placements, with either of its 'any' stones
+#   - 7 and 8 fail at all four placements with one of their two 'any' stones
+#   - 4 fails in two of its six orientations, the ones placed at e6 and d3
+#   - the bridges, 3, 5 (432), 6 and 9 hold everywhere
+#
+# Solving - Solver plays out 3x3 to 5x5 boards exhaustively with a memoised
+# negamax, using bitmask flood fills for the win checks, and can start from
+# any HexBoard position. The empty 5x5 board takes about half a minute.
+#
+# Example: python verify.py --patterns --solve 3 4
+
+import argparse
+import patterns
+import geometry
+import symmetry
+import templates
+
+class PatternVerifier():
+    def __init__(self, board_dimension=8):
+        self.board_dimension = board_dimension
+        self.geometry = geometry.get_geometry(board_dimension)
+        # The board whose get_move and reply functions are being checked, only
+        # its substrategies are used
+        self.board = patterns.HexBoard(board_dimension)
+        # (black, white, live substrategies) to None when black connects from
+        # there, or the line of (white, black) cell indices that breaks it
+        self.table = {}
+        self.anchor = None
+        self.goal = 0
+
+    def placements(self, template):
+        # Yields (anchor, black mask, white mask, substrategy, goal row mask)
+        # for the template with its far row on a black edge, once for each of
+        # its 'any' stones. The anchor nearest the middle of the board is used
+        n = self.board_dimension
+        anchors = sorted(self.geometry.coords, key=lambda cell: (abs(cell[0] - n//2), cell[1]))
+        for any_offset in template.get('any') or [None]:
+            for x, y in anchors:
+                stones = [(0,0)] + template.get('black', [])
+                if any_offset is not None:
+                    stones = stones + [any_offset]
+                black = self.offsets_mask(x, y, stones)
+                white = self.offsets_mask(x, y, template.get('white', []))
+                if black is None or white is None:
+                    continue
+                board = patterns.HexBoard(n)
+                for index in patterns.mask_indices(black):
+                    board.set_stone(index % n, index // n, patterns.BLACK)
+                for index in patterns.mask_indices(white):
+                    board.set_stone(index % n, index // n, patterns.WHITE)
+                cells = tuple((y+dy)*n + (x+dx) for dx, dy in template['cells'])
+                record = patterns.Substrategy(template['id'], cells)
+                if record not in board.match_templates(y*n + x, template['group'], patterns.BLACK, []):
+                    continue
+                rows = [y+dy for dx, dy in template['cells'] + template.get('black', [])]
+                if max(rows) == n-1 and min(rows) > 0:
+                    yield y*n + x, black, white, record, self.geometry.last_row_mask
+                    break
+                elif min(rows) == 0 and max(rows) < n-1:
+                    yield y*n + x, black, white, record, self.geometry.first_row_mask
+                    break
+
+    def offsets_mask(self, x, y, offsets):
+        # Mask of the cells at the offsets from x,y, None if one is off the board
+        n = self.board_dimension
+        mask = 0
+        for dx, dy in offsets:
+            if not (0 <= x+dx < n and 0 <= y+dy < n):
+                return None
+            mask |= 1 << ((y+dy)*n + (x+dx))
+        return mask
+
+    def verify_template(self, template):
+        # Returns a (placement, failing line) pair for every placement of the
+        # template, the line is None when the pattern holds. The list is empty
+        # if the template can't be placed on this board
+        results = []
+        for anchor, black, white, record, goal in self.placements(template):
+            self.anchor = anchor
+            self.goal = goal
+            self.table = {}
+            results.append(((anchor, black, white, record), self.search(black, white, (record,))))
+        return results
+
+    def connected(self, black):
+        # True when the anchor stone reaches the goal row through black stones
+        reach = 1 << self.anchor
+        while True:
+            grown = reach | (self.geometry.neighbours_of(reach) & black)
+            if grown == reach:
+                return reach & self.goal != 0
+            reach = grown
+
+    def search(self, black, white, live):
+        # Returns None if black connects against every white line from this
+        # position, otherwise one losing line of (white, black) cell indices
+        if not live:
+            return None if self.connected(black) else []
+        key = (black, white, live)
+        if key in self.table:
+            return self.table[key]
+
+        n = self.board_dimension
+        result = None
+        cells = sorted({cell for record in live for cell in record.cells})
+        for move in cells:
+            strategies = patterns.StrategySet(n, live)
+            self.board.substrategies = strategies
+            try:
+                x, y = self.board.get_move(strategies.containing(move)[0], move)
+            except ValueError:
+                # The reply functions couldn't find white's cell
+                result = [(move, None)]
+                break
+            reply = y*n + x
+            strategies.discard_cell(move)
+            if (black | white | (1 << move)) >> reply & 1:
+                # Black replied on a cell that is already taken
+                result = [(move, reply)]
+                break
+            strategies.discard_cell(reply)
+            line = self.search(black | (1 << reply), white | (1 << move), tuple(strategies))
+            if line is not None:
+                result = [(move, reply)] + line
+                break
+
+        self.table[key] = result
+        return result
+
+def verify_patterns(board_dimension=8):
+    # Verifies every template in the pattern table, returns a list of
+    # (template, placement, failing line) and the verifier
+    verifier = PatternVerifier(board_dimension)
+    results = []
+    for template in templates.PATTERN_TABLE:
+        found = verifier.verify_template(template)
+        if not found:
+            results.append((template, None, None))
+        for placement, line in found:
+            results.append((template, placement, line))
+    return results, verifier
+
+class Solver():
+    # Exhaustive solver for small boards. Positions are memoised by their
+    # canonical form, so a position reached by different move orders or
+    # mirrored is only searched once. Bridge chains end the
+    # search early, and only moves that can still matter are tried, see wins
+    def __init__(self, board_dimension):
+        self.board_dimension = board_dimension
+        self.geometry = geometry.get_geometry(board_dimension)
+        self.symmetry = symmetry.get_symmetry(board_dimension)
+        self.table = {}
+        # Centre cells first, they decide most games soonest
+        centre = (board_dimension - 1) / 2
+        self.order = sorted(range(self.geometry.cell_count),
+                            key=lambda index: abs(index % board_dimension - centre) + abs(index // board_dimension - centre))
+        self.edges = {
+            patterns.BLACK: (self.geometry.first_row_mask, self.geometry.last_row_mask),
+            patterns.WHITE: (self.geometry.first_column_mask, self.geometry.last_column_mask),
+        }
+
+    def connects(self, stones, color):
+        # True when stones join the two edges of color, by flooding from the
+        # first edge
+        start, goal = self.edges[color]
+        reach = stones & start
+        while reach:
+            if reach & goal:
+                return True
+            grown = reach | (self.geometry.neighbours_of(reach) & stones)
+            if grown == reach:
+                return False
+            reach = grown
+        return False
+
+    def virtual_connection(self, stones, empty, color):
+        # Looks for a connection of color that holds even with the opponent to
+        # move: chains of stones linked to each other and to the edges
+        # directly or by two empty cells they both touch (bridges and edge
+        # bridges), no two links sharing a cell, so every intrusion into a
+        # link can be answered in the same link. Returns the mask of the link
+        # cells, or None when no such chain is found. Not every connection is
+        # found, but every one found is real
+        start, goal = self.edges[color]
+        neighbours_of = self.geometry.neighbours_of
+        # Nodes are the two edges and the groups of stones, as the stones and
+        # the cells next to them. An edge has no stones, its row or column is
+        # next to it
+        nodes = [(0, start), (0, goal)]
+        remaining = stones
+        while remaining:
+            group = remaining & -remaining
+            while True:
+                grown = group | (neighbours_of(group) & stones)
+                if grown == group:
+                    break
+                group = grown
+            remaining &= ~group
+            nodes.append((group, neighbours_of(group)))
+
+        def link(node1, node2):
+            # Cells linking two nodes, 0 when they touch, None when they
+            # are not linked
+            (cells1, next1), (cells2, next2) = node1, node2
+            if cells1 & next2 or cells2 & next1:
+                return 0
+            common = next1 & next2 & empty
+            first = common & -common
+            second = (common ^ first) & -(common ^ first)
+            if not second:
+                return None
+            return first | second
+
+        frontier = [(0, 0)]
+        visited = {0}
+        while frontier:
+            node, used = frontier.pop(0)
+            for other in range(1, len(nodes)):
+                if other in visited or (node == 0 and other == 1):
+                    continue
+                cells = link(nodes[node], nodes[other])
+                if cells is None or cells & used:
+                    continue
+                if other == 1:
+                    return used | cells
+                visited.add(other)
+                frontier.append((other, used | cells))
+        return None
+
+    def wins(self, own, other, color):
+        # Returns (won, move, carrier) for color holding the stones in own
+        # with color to move. carrier is a mask of empty cells the result
+        # depends on: the same side still wins whatever happens to the other
+        # empty cells. The table is keyed on canonical positions, see
+        # symmetry.py, so the mirror images of a position share one entry
+        if color == patterns.BLACK:
+            key, transform = self.symmetry.canonical(own, other, color)
+        else:
+            key, transform = self.symmetry.canonical(other, own, color)
+        if key in self.table:
+            return self.transform_result(self.table[key], transform)
+        result = self.search(own, other, color)
+        self.table[key] = self.transform_result(result, transform)
+        return result
+
+    def transform_result(self, result, transform):
+        # A result of wins after transform, every transform is its own inverse
+        won, move, carrier = result
+        if move is not None:
+            move = self.symmetry.transform_cell(move, transform)
+        return won, move, self.symmetry.transform_bits(carrier, transform)
+
+    def search(self, own, other, color):
+        # Works out the result of wins for a position that isn't in the
+        # table. Once a move loses, any move outside the carrier of the
+        # opponent's win loses too, so only moves inside it are tried next
+        empty = self.geometry.full_mask & ~(own | other)
+        opponent = patterns.WHITE if color == patterns.BLACK else patterns.BLACK
+
+        if not self.connects(own | empty, color):
+            # Even every empty cell wouldn't connect color, the opponent's
+            # stones already do
+            return (False, None, 0)
+        carrier = self.virtual_connection(other, empty, opponent)
+        if carrier is not None:
+            # The opponent is connected whatever color plays
+            return (False, None, carrier)
+        carrier = self.virtual_connection(own, empty, color)
+        if carrier is not None:
+            # color is connected, playing in one of the links keeps it
+            move = (carrier or empty) & -(carrier or empty)
+            return (True, move.bit_length() - 1 if move else None, carrier)
+
+        # A cell that would give the opponent a connection is a threat,
+        # color has to play in the threat or its links
+        allowed = empty
+        losing = 0
+        for index in self.order:
+            bit = 1 << index
+            if empty & bit:
+                carrier = self.virtual_connection(other | bit, empty & ~bit, opponent)
+                if carrier is not None:
+                    allowed &= carrier | bit
+                    losing |= carrier | bit
+        result = None
+        for index in self.order:
+            bit = 1 << index
+            if not allowed & bit:
+                continue
+            won, move, carrier = self.wins(other, own | bit, opponent)
+            if not won:
+                result = (True, index, carrier | bit)
+                break
+            allowed &= carrier
+            losing |= carrier | bit
+        if result is None:
+            result = (False, None, losing)
+        return result
+
+    def solve(self, black, white, to_move):
+        # Returns (winner, winning move of the side to move or None)
+        if to_move == patterns.BLACK:
+            won, move, carrier = self.wins(black, white, patterns.BLACK)
+            return (patterns.BLACK, move) if won else (patterns.WHITE, None)
+        won, move, carrier = self.wins(white, black, patterns.WHITE)
+        return (patterns.WHITE, move) if won else (patterns.BLACK, None)
+
+# Solvers of each board size, their tables are kept between calls
+solvers = {}
+
+def get_solver(board_dimension):
+    solver = solvers.get(board_dimension)
+    if solver is None:
+        solver = solvers[board_dimension] = Solver(board_dimension)
+    return solver
+
+def solve_position(board, to_move=None):
+    # Solves a HexBoard position, returns the winner with perfect play and the
+    # x,y of a winning move for the side to move (None if it loses). Black
+    # moves first, so by default black is to move when the stone counts match
+    if to_move is None:
+        black_stones = bin(board.black_bits).count('1')
+        white_stones = bin(board.white_bits).count('1')
+        to_move = patterns.BLACK if black_stones == white_stones else patterns.WHITE
+    solver = get_solver(board.board_dimension)
+    winner, move = solver.solve(board.black_bits, board.white_bits, to_move)
+    if move is not None:
+        move = patterns.index_2_coord(move, board.board_dimension)
+    return winner, move
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify the pattern strategies and solve small boards")
+    parser.add_argument('--patterns', action='store_true', help="verify every pattern template")
+    parser.add_argument('--size', type=int, default=8, help="board size the patterns are placed on")
+    parser.add_argument('--solve', type=int, nargs='*', default=[], help="solve the empty boards of these sizes")
+    args = parser.parse_args(argv)
+    failures = 0
+
+    if args.patterns or not args.solve:
+        results, verifier = verify_patterns(args.size)
+        n = args.size
+        positions = verifier.geometry.positions
+        for template, placement, line in results:
+            if placement is None:
+                print('id %-2d %-8s does not fit on a %dx%d board' % (template['id'], template['group'], n, n))
+                continue
+            anchor, black, white, record = placement
+            if line is None:
+                print('id %-2d %-8s at %-3s holds' % (template['id'], template['group'], positions[anchor]))
+            else:
+                failures += 1
+                moves = ' '.join('W%s B%s' % (positions[w], positions[b] if b is not None else '?') for w, b in line)
+                print('id %-2d %-8s at %-3s FAILS: %s' % (template['id'], template['group'], positions[anchor], moves))
+        counts = ', '.join('%d: %d' % item for item in sorted(verifier.board.reply_counts.items()))
+        print('replies checked by pattern id: ' + counts)
+
+    for board_dimension in args.solve:
+        winner, move = solve_position(patterns.HexBoard(board_dimension))
+        name = 'black' if winner == patterns.BLACK else 'white'
+        opening = geometry.get_geometry(board_dimension).positions[move[1]*board_dimension + move[0]] if move else '-'
+        print('%dx%d: %s wins, first winning move %s, %d positions'
+              % (board_dimension, board_dimension, name, opening, len(solvers[board_dimension].table)))
+    return failures
+
+if __name__ == "__main__":
+    raise SystemExit(1 if main() else 0)